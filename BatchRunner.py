@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Generates many designs from a manifest without launching Inkscape.
+
+Each job of the manifest names an extension and the values of its options. The options are parsed by the extension
+itself, i.e. the option schema and the defaults are taken from its .inx file. The jobs are distributed over a pool of
+worker processes and every job writes a separate SVG file.
+
+Usage: python BatchRunner.py [options] MANIFEST
+
+The manifest is either a CSV file with a header row or a JSON file containing a list of objects (or an object with a
+"jobs" list). The column/key "extension" selects the extension, the optional column/key "output" the name of the
+generated file. All other columns/keys are passed as options; empty CSV cells are skipped, so the default is used.
+
+The inkex module of Inkscape has to be on the PYTHONPATH, e.g. the share/extensions directory of the installation.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import csv
+import json
+import multiprocessing
+import optparse
+import os
+import sys
+import tempfile
+import traceback
+
+# extension name -> (module, class)
+EXTENSIONS = {
+    'LaserBox': ('LaserBox', 'LaserBox'),
+    'TabLines': ('TabLines', 'TabLines'),
+    'LatticeLivingHinges': ('LatticeLivingHinges', 'LatticeLivingHinges'),
+    'PenroseTiling': ('PenroseTiling', 'PenroseTiling'),
+    'FoldableBox': ('ReinforcedFoldableBox', 'FoldableBox'),
+    'ReinforcedFoldableBox': ('ReinforcedFoldableBox', 'FoldableBox'),
+}
+
+# empty document equivalent to the default template of Inkscape 0.92 (A4, user unit is mm)
+DEFAULT_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     width="210mm" height="297mm" viewBox="0 0 210 297" version="1.1">
+  <sodipodi:namedview id="base" inkscape:document-units="mm" inkscape:current-layer="layer1"/>
+  <g inkscape:label="Layer 1" inkscape:groupmode="layer" id="layer1"/>
+</svg>
+"""
+
+
+def createExtension(extensionName):
+    """Imports the module of the extension and returns a new instance of the extension class."""
+    if extensionName not in EXTENSIONS:
+        raise Exception('Unknown extension "' + str(extensionName) + '". Known extensions: ' +
+                        ', '.join(sorted(EXTENSIONS.keys())))
+    moduleName, className = EXTENSIONS[extensionName]
+    module = __import__(moduleName)
+    return getattr(module, className)()
+
+
+def formatOptionValue(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def toArguments(options):
+    """Converts a dict of option values into command line arguments as passed by Inkscape."""
+    return ['--' + name + '=' + formatOptionValue(value) for name, value in sorted(options.items())]
+
+
+def readManifest(manifestFile):
+    """Returns the jobs of the manifest as a list of dicts."""
+    if manifestFile.lower().endswith('.json'):
+        with open(manifestFile) as stream:
+            jobs = json.load(stream)
+        if isinstance(jobs, dict):
+            jobs = jobs['jobs']
+        return [dict(job) for job in jobs]
+    with open(manifestFile) as stream:
+        # empty cells are skipped, so the extension's default is used for them
+        return [dict((k.strip(), v.strip()) for k, v in row.items() if k and v is not None and v.strip())
+                for row in csv.DictReader(stream)]
+
+
+def createTasks(jobs, outputDir, templateFile, stream=False):
+    tasks = []
+    for index, job in enumerate(jobs):
+        options = dict(job)
+        extensionName = options.pop('extension', None)
+        outputName = options.pop('output', None) or '%s-%04d.svg' % (extensionName, index)
+        tasks.append((index, extensionName, options, os.path.abspath(os.path.join(outputDir, outputName)),
+                      templateFile, stream))
+    return tasks
+
+
+def runTask(task):
+    """Runs a single job. Returns (index, outputFile, errorMessage), errorMessage is None on success."""
+    index, extensionName, options, outputFile, templateFile, stream = task
+    try:
+        effect = createExtension(extensionName)
+        if stream:
+            # the paths are written to the output file while they are generated
+            effect.affect(toArguments(options) + ['--stream=' + outputFile, templateFile], False)
+        else:
+            effect.affect(toArguments(options) + [templateFile], False)
+            effect.document.write(outputFile)
+        return (index, outputFile, None)
+    except SystemExit:
+        # optparse exits on invalid options, after printing the reason to stderr
+        return (index, outputFile, 'Invalid options ' + ' '.join(toArguments(options)))
+    except Exception:
+        return (index, outputFile, traceback.format_exc())
+
+
+def runBatch(jobs, outputDir='.', processes=None, templateFile=None, stream=False):
+    """
+    Generates an SVG file per job using a pool of worker processes. Returns the list of (index, outputFile,
+    errorMessage) in the order of the jobs. With stream the paths are written directly into the output files
+    instead of building the documents in memory.
+    """
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+    temporaryTemplate = None
+    if templateFile is None:
+        handle, temporaryTemplate = tempfile.mkstemp(suffix='.svg')
+        os.write(handle, DEFAULT_TEMPLATE.encode('utf-8'))
+        os.close(handle)
+        templateFile = temporaryTemplate
+    tasks = createTasks(jobs, outputDir, os.path.abspath(templateFile), stream)
+    try:
+        if processes == 1:
+            results = [runTask(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = sorted(pool.imap_unordered(runTask, tasks))
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        if temporaryTemplate is not None:
+            os.remove(temporaryTemplate)
+    return results
+
+
+def main(args=sys.argv[1:]):
+    parser = optparse.OptionParser(usage='usage: %prog [options] MANIFEST')
+    parser.add_option('-o', '--output-dir', dest='outputDir', default='.',
+                      help='directory for the generated SVG files [default: %default]')
+    parser.add_option('-p', '--processes', dest='processes', type='int', default=None,
+                      help='number of worker processes [default: number of CPUs]')
+    parser.add_option('-t', '--template', dest='template', default=None,
+                      help='SVG document the designs are added to [default: empty A4 document]')
+    parser.add_option('-s', '--stream', dest='stream', action='store_true', default=False,
+                      help='write the paths directly into the output files, for very large designs')
+    options, arguments = parser.parse_args(args)
+    if len(arguments) != 1:
+        parser.error('exactly one manifest file has to be specified')
+
+    results = runBatch(readManifest(arguments[0]), options.outputDir, options.processes, options.template,
+                       options.stream)
+    failures = 0
+    for index, outputFile, errorMessage in results:
+        if errorMessage is None:
+            sys.stdout.write('%d: %s\n' % (index, outputFile))
+        else:
+            failures += 1
+            sys.stderr.write('%d: FAILED %s\n%s\n' % (index, outputFile, errorMessage))
+    sys.stdout.write('%d of %d designs generated\n' % (len(results) - failures, len(results)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
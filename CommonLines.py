@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Removes line segments that are cut more than once, e.g. where the parts of a box touch each other (common-line
+cutting).
+
+The segments are taken one after the other. Every segment is compared with the segments kept so far, which are
+found with a spatial hash: a grid of square cells, where each segment is registered in all cells its bounding box
+touches. If a kept segment lies on the same line (within the tolerance), the part of the new segment it covers is
+removed; what is left of the new segment is kept.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+
+class SegmentHash(object):
+    """A spatial hash of segments (x1, y1, x2, y2), which are identified by their index in the list of segments."""
+    def __init__(self, cellSize, margin):
+        self._cellSize = float(cellSize)
+        self._margin = margin
+        self._cells = {}
+        self.segments = []
+
+    def _getCells(self, segment):
+        x1, y1, x2, y2 = segment
+        minCellX = int(math.floor((min(x1, x2) - self._margin) / self._cellSize))
+        maxCellX = int(math.floor((max(x1, x2) + self._margin) / self._cellSize))
+        minCellY = int(math.floor((min(y1, y2) - self._margin) / self._cellSize))
+        maxCellY = int(math.floor((max(y1, y2) + self._margin) / self._cellSize))
+        for cellX in xrange(minCellX, maxCellX + 1):
+            for cellY in xrange(minCellY, maxCellY + 1):
+                yield (cellX, cellY)
+
+    def add(self, segment):
+        index = len(self.segments)
+        self.segments.append(segment)
+        for cell in self._getCells(segment):
+            self._cells.setdefault(cell, []).append(index)
+
+    def getCandidates(self, segment):
+        """Returns the indices of the segments, whose cells overlap with the cells of the segment."""
+        candidates = set()
+        for cell in self._getCells(segment):
+            candidates.update(self._cells.get(cell, ()))
+        return candidates
+
+
+def getCoveredInterval(segment, other, tolerance):
+    """
+    Returns the interval (start, end) of the segment, measured as distance from its start, which is covered by the
+    other segment, or None if the segments do not lie on the same line or do not overlap.
+    """
+    x1, y1, x2, y2 = segment
+    length = math.hypot(x2 - x1, y2 - y1)
+    directionX = (x2 - x1) / length
+    directionY = (y2 - y1) / length
+    otherX1, otherY1, otherX2, otherY2 = other
+    # distances of the end points of the other segment from the line of the segment
+    if abs(directionX * (otherY1 - y1) - directionY * (otherX1 - x1)) > tolerance or \
+            abs(directionX * (otherY2 - y1) - directionY * (otherX2 - x1)) > tolerance:
+        return None
+    start = directionX * (otherX1 - x1) + directionY * (otherY1 - y1)
+    end = directionX * (otherX2 - x1) + directionY * (otherY2 - y1)
+    start, end = max(min(start, end), 0.0), min(max(start, end), length)
+    if end - start <= tolerance:
+        return None
+    return (start, end)
+
+
+def getUncoveredIntervals(length, coveredIntervals, tolerance):
+    """Returns the parts of the interval (0, length) that are not covered, ignoring parts up to the tolerance."""
+    uncovered = []
+    position = 0.0
+    for start, end in sorted(coveredIntervals):
+        if start - position > tolerance:
+            uncovered.append((position, start))
+        position = max(position, end)
+    if length - position > tolerance:
+        uncovered.append((position, length))
+    return uncovered
+
+
+def removeCommonLines(segments, tolerance):
+    """
+    Returns (kept pieces, removed length): for each of the segments (x1, y1, x2, y2) the list of the pieces that do
+    not lie on top of segments that come before it. A segment that is not covered at all is returned as the only
+    piece of its list. Segments up to the tolerance in length are kept, but not compared.
+    """
+    lengths = [math.hypot(x2 - x1, y2 - y1) for x1, y1, x2, y2 in segments]
+    # about the average length of the segments, so most segments are registered in a few cells only
+    cellSize = max(sum(lengths) / max(len(lengths), 1), 10 * tolerance)
+    keptSegments = SegmentHash(cellSize, tolerance)
+    keptPieces = []
+    removedLength = 0.0
+    for segment, length in zip(segments, lengths):
+        if length <= tolerance:
+            keptPieces.append([segment])
+            continue
+        coveredIntervals = []
+        for index in keptSegments.getCandidates(segment):
+            interval = getCoveredInterval(segment, keptSegments.segments[index], tolerance)
+            if interval is not None:
+                coveredIntervals.append(interval)
+        if not coveredIntervals:
+            keptSegments.add(segment)
+            keptPieces.append([segment])
+            continue
+        x1, y1, x2, y2 = segment
+        directionX = (x2 - x1) / length
+        directionY = (y2 - y1) / length
+        pieces = []
+        keptLength = 0.0
+        for start, end in getUncoveredIntervals(length, coveredIntervals, tolerance):
+            # the original end points are kept where possible, so the segments still meet their neighbours exactly
+            startX, startY = (x1, y1) if start == 0.0 else (x1 + start * directionX, y1 + start * directionY)
+            endX, endY = (x2, y2) if end == length else (x1 + end * directionX, y1 + end * directionY)
+            piece = (startX, startY, endX, endY)
+            keptSegments.add(piece)
+            pieces.append(piece)
+            keptLength += end - start
+        keptPieces.append(pieces)
+        removedLength += length - keptLength
+    return keptPieces, removedLength
@@ -16,6 +16,11 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import copy
+import os
+
+import BatchRunner
+import Nesting
 import SvgBasics
 import inkex
 import simplestyle
@@ -27,6 +32,9 @@ class DrawDirection:
         self.runsTowardsOrigin = runsTowardsOrigin
         self.directionMulitplier = -1 if runsTowardsOrigin else 1
 
+    def __repr__(self):
+        return 'DrawDirection(%s, %s)' % (self.isVertical, self.runsTowardsOrigin)
+
 NORTH = DrawDirection(True, True)
 EAST = DrawDirection(False, False)
 SOUTH = DrawDirection(True, False)
@@ -36,24 +44,40 @@ WEST = DrawDirection(False, True)
 class LaserBox(SvgBasics.BaseEffectExtension):
     def __init__(self):
         SvgBasics.BaseEffectExtension.__init__(self, "LaserBox.inx")
+        # parameters of an indented edge -> PathBuilder with the relative lines of the edge
+        self._indentedEdges = {}
 
-    def _getRelativeLineCoords(self, length, isVertical):
+    def _addRelativeLine(self, path, length, isVertical):
         if isVertical:
-            return '0,' + str(length) + ' '
+            path.lineRel(0, length)
         else:
-            return str(length) + ',0 '
+            path.lineRel(length, 0)
 
-    def _generateIndentedEdge(self, indentCount, indentWidth, drawDirection, startIndented, initialOffset=0,
+    def _generateIndentedEdge(self, path, indentCount, indentWidth, drawDirection, startIndented, initialOffset=0,
                               lastOffset=0):
-        self.log([indentCount, indentWidth, drawDirection, startIndented, initialOffset, lastOffset])
-        relativeLine = ' l'
+        # the edge consists of relative lines only, so sides and boxes with the same parameters share one fragment
+        key = (indentCount, indentWidth, drawDirection.isVertical, drawDirection.runsTowardsOrigin, startIndented,
+               initialOffset, lastOffset, self.thickness)
+        fragment = self._indentedEdges.get(key)
+        if fragment is None:
+            fragment = self._createIndentedEdge(indentCount, indentWidth, drawDirection, startIndented, initialOffset,
+                                                lastOffset)
+            self._indentedEdges[key] = fragment
+        else:
+            self._profiler.count('indented edges reused')
+        return path.extend(fragment)
+
+    def _createIndentedEdge(self, indentCount, indentWidth, drawDirection, startIndented, initialOffset, lastOffset):
+        if self._traceLevel >= SvgBasics.TRACE_VERBOSE:
+            self.trace(SvgBasics.TRACE_VERBOSE, 'indented edge: count %s, width %s, direction %s, start indented %s, '
+                       'offsets %s/%s', indentCount, indentWidth, drawDirection, startIndented, initialOffset,
+                       lastOffset)
         currentIndent = -self.thickness if startIndented else self.thickness
-        initialEdge = self._getRelativeLineCoords(drawDirection.directionMulitplier * (indentWidth + initialOffset),
-                                                  drawDirection.isVertical)
-        lastEdge = self._getRelativeLineCoords(drawDirection.directionMulitplier * (indentWidth + lastOffset),
-                                               drawDirection.isVertical)
-        edge = self._getRelativeLineCoords(drawDirection.directionMulitplier * indentWidth, drawDirection.isVertical)
+        initialEdge = drawDirection.directionMulitplier * (indentWidth + initialOffset)
+        lastEdge = drawDirection.directionMulitplier * (indentWidth + lastOffset)
+        edge = drawDirection.directionMulitplier * indentWidth
 
+        path = SvgBasics.PathBuilder()
         for count in xrange(0, indentCount):
             appendEdge = edge
             if count == 0:
@@ -61,11 +85,11 @@ class LaserBox(SvgBasics.BaseEffectExtension):
             elif count == indentCount - 1:
                 appendEdge = lastEdge
 
-            relativeLine += appendEdge
+            self._addRelativeLine(path, appendEdge, drawDirection.isVertical)
             if count + 1 < indentCount:
-                relativeLine += self._getRelativeLineCoords(currentIndent, not drawDirection.isVertical)
+                self._addRelativeLine(path, currentIndent, not drawDirection.isVertical)
                 currentIndent *= -1
-        return relativeLine
+        return path
 
     def _calculateFinalIndentationAndOffsetForHorizontalLine(self, verticalLineStartedIndented):
         # determine whether the first vertical line drawn is indented at the end
@@ -80,10 +104,10 @@ class LaserBox(SvgBasics.BaseEffectExtension):
 
     def _createIndentedVerticalLine(self, upperLeftOffsetX, upperLeftOffsetY, startIndented):
         # set starting point of line
-        joinedLine = 'M ' + str(upperLeftOffsetX) + ',' + str(upperLeftOffsetY)
+        joinedLine = SvgBasics.PathBuilder().moveAbs(upperLeftOffsetX, upperLeftOffsetY)
         # draw southwards
-        joinedLine += self._generateIndentedEdge(self.options.countIndentsSides, self.lengthOfSideIndents, SOUTH,
-                                                 startIndented)
+        self._generateIndentedEdge(joinedLine, self.options.countIndentsSides, self.lengthOfSideIndents, SOUTH,
+                                   startIndented)
         isLineToSouthIndentedAtEnd, initialOffset, lastOffset = self._calculateFinalIndentationAndOffsetForHorizontalLine(
             startIndented)
         return (joinedLine, isLineToSouthIndentedAtEnd, initialOffset, lastOffset)
@@ -96,56 +120,49 @@ class LaserBox(SvgBasics.BaseEffectExtension):
         leftSideStartIndented = False
         joinedLine, isLineToSouthIndentedAtEnd, initialOffset, lastOffset = self._createIndentedVerticalLine(
             upperLeftOffsetX, upperLeftOffsetY, leftSideStartIndented)
-        joinedLine += self._generateIndentedEdge(horizontalIndentsCount, horizontalIndentsWidth, EAST, True,
-                                                 initialOffset, lastOffset)
-        joinedLine += self._generateIndentedEdge(self.options.countIndentsSides, self.lengthOfSideIndents, NORTH,
-                                                 isLineToSouthIndentedAtEnd)
+        self._generateIndentedEdge(joinedLine, horizontalIndentsCount, horizontalIndentsWidth, EAST, True,
+                                   initialOffset, lastOffset)
+        self._generateIndentedEdge(joinedLine, self.options.countIndentsSides, self.lengthOfSideIndents, NORTH,
+                                   isLineToSouthIndentedAtEnd)
 
         # determine whether the second vertical line drawn is indented at the end
         isLineToNorthIndentedAtEnd, initialOffset, lastOffset = self._calculateFinalIndentationAndOffsetForHorizontalLine(
             isLineToSouthIndentedAtEnd)
         if self.options.includeLid:
-            joinedLine += self._generateIndentedEdge(horizontalIndentsCount, horizontalIndentsWidth, WEST, False,
-                                                     lastOffset, initialOffset)
-        joinedLine += 'z'
+            self._generateIndentedEdge(joinedLine, horizontalIndentsCount, horizontalIndentsWidth, WEST, False,
+                                       lastOffset, initialOffset)
+        joinedLine.close()
         return joinedLine
 
-    def _addSideShape(self, name, style, upperLeftOffsetX, upperLeftOffsetY, isForWidthSide):
-        svgPath = self._generateSideShape(upperLeftOffsetX, upperLeftOffsetY, isForWidthSide)
-        self._addPathToDocumentTree(style, svgPath, name)
-
     def _generateTopShape(self, upperLeftOffsetX, upperLeftOffsetY):
-        joinedLine = 'M ' + str(upperLeftOffsetX) + ',' + str(upperLeftOffsetY)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, SOUTH, True)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, False)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, NORTH, False)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST, True)
-        joinedLine += 'z'
+        joinedLine = SvgBasics.PathBuilder().moveAbs(upperLeftOffsetX, upperLeftOffsetY)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, SOUTH, True)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, False)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, NORTH, False)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST, True)
+        joinedLine.close()
         return joinedLine
 
-    def _addTopShape(self, name, style, upperLeftOffsetX, upperLeftOffsetY):
-        svgPath = self._generateTopShape(upperLeftOffsetX, upperLeftOffsetY)
-        self._addPathToDocumentTree(style, svgPath, name)
-
-    def _addMergedSideShape(self, style, upperLeftOffsetX, upperLeftOffsetY):
+    def _generateMergedSideShapes(self, style, upperLeftOffsetX, upperLeftOffsetY):
+        """Returns the merged sides and the cuts between them as list of (style, path, name)."""
         # using a variable here enables usage as parameter (not tested!)
         leftSideStartIndented = False
         joinedLine, isLineToSouthIndentedAtEnd, initialOffset, lastOffset = self._createIndentedVerticalLine(
             upperLeftOffsetX, upperLeftOffsetY, leftSideStartIndented)
 
         # draw eastwards - two times for the width, two times for the depth
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, True,
-                                                 initialOffset, lastOffset)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, True,
-                                                 initialOffset, lastOffset)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, EAST, True,
-                                                 initialOffset, lastOffset)
-        joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, EAST, True,
-                                                 initialOffset, lastOffset)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, True,
+                                   initialOffset, lastOffset)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, EAST, True,
+                                   initialOffset, lastOffset)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, EAST, True,
+                                   initialOffset, lastOffset)
+        self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, EAST, True,
+                                   initialOffset, lastOffset)
 
         # draw northwards
-        joinedLine += self._generateIndentedEdge(self.options.countIndentsSides, self.lengthOfSideIndents, NORTH,
-                                                 isLineToSouthIndentedAtEnd)
+        self._generateIndentedEdge(joinedLine, self.options.countIndentsSides, self.lengthOfSideIndents, NORTH,
+                                   isLineToSouthIndentedAtEnd)
 
         # determine whether the second vertical line drawn is indented at the end
         isLineToNorthIndentedAtEnd, initialOffset, lastOffset = self._calculateFinalIndentationAndOffsetForHorizontalLine(
@@ -154,33 +171,34 @@ class LaserBox(SvgBasics.BaseEffectExtension):
         # draw westwards and close the shape
         if self.options.includeLid:
             # repeat the same spiel backwards
-            joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, WEST,
-                                                     False, lastOffset, initialOffset)
-            joinedLine += self._generateIndentedEdge(self.countIndentsTopDepth, self.lengthOfTopDepthIndents, WEST,
-                                                     False, lastOffset, initialOffset)
-            joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST,
-                                                     False, lastOffset, initialOffset)
-            joinedLine += self._generateIndentedEdge(self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST,
-                                                     False, lastOffset, initialOffset)
-
-        joinedLine += 'z'
-        self._addPathToDocumentTree(style, joinedLine, "sides")
+            self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, WEST,
+                                       False, lastOffset, initialOffset)
+            self._generateIndentedEdge(joinedLine, self.countIndentsTopDepth, self.lengthOfTopDepthIndents, WEST,
+                                       False, lastOffset, initialOffset)
+            self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST,
+                                       False, lastOffset, initialOffset)
+            self._generateIndentedEdge(joinedLine, self.countIndentsTopWidth, self.lengthOfTopWidthIndents, WEST,
+                                       False, lastOffset, initialOffset)
+
+        joinedLine.close()
+        shapes = [(style, joinedLine, "sides")]
 
         noFillStyle = simplestyle.formatStyle(
             {'stroke': '#000000', 'stroke-width': str(self.linewidth), 'fill': 'none'})
         joinedLine = \
             self._createIndentedVerticalLine(upperLeftOffsetX + self.insideWidth + self.thickness, upperLeftOffsetY,
                                              leftSideStartIndented)[0]
-        self._addPathToDocumentTree(noFillStyle, joinedLine, "cut0")
+        shapes.append((noFillStyle, joinedLine, "cut0"))
         joinedLine = \
             self._createIndentedVerticalLine(upperLeftOffsetX + 2 * (self.insideWidth + self.thickness),
                                              upperLeftOffsetY,
                                              leftSideStartIndented)[0]
-        self._addPathToDocumentTree(noFillStyle, joinedLine, "cut1")
+        shapes.append((noFillStyle, joinedLine, "cut1"))
         joinedLine = self._createIndentedVerticalLine(
             upperLeftOffsetX + 2 * (self.insideWidth + self.thickness) + self.insideDepth + self.thickness,
             upperLeftOffsetY, leftSideStartIndented)[0]
-        self._addPathToDocumentTree(noFillStyle, joinedLine, "cut2")
+        shapes.append((noFillStyle, joinedLine, "cut2"))
+        return shapes
 
     def _calculateDimensions(self):
         # calculate required dimensions in Inkscape units derived from the options
@@ -222,22 +240,143 @@ class LaserBox(SvgBasics.BaseEffectExtension):
         self.lengthOfTopWidthIndents = self.insideWidth / self.countIndentsTopWidth
         self.lengthOfTopDepthIndents = self.insideDepth / self.countIndentsTopDepth
 
-    def effect(self):
-        self._calculateDimensions()
-        style = simplestyle.formatStyle({'stroke': '#000000', 'stroke-width': str(self.linewidth), 'fill': '#808080'})
+    def _generateParts(self, style):
+        """
+        Returns the parts of the box in the fixed layout: a list of parts, each a list of (style, path, name). All
+        paths of a part are cut from the same piece of material, e.g. the merged sides and the cuts between them.
+        """
         if self.options.mergeSides:
-            self._addMergedSideShape(style, 0, 0);
+            parts = [self._generateMergedSideShapes(style, 0, 0)]
         else:
-            self._addSideShape('front', style, 0, 0, True)
-            self._addSideShape('back', style, self.outsideWidth, 0, True)
-            self._addSideShape('right', style, 2 * self.outsideWidth, 0, False)
-            self._addSideShape('left', style, 2 * self.outsideWidth + self.outsideDepth, 0, False)
+            parts = [[(style, self._generateSideShape(0, 0, True), 'front')],
+                     [(style, self._generateSideShape(self.outsideWidth, 0, True), 'back')],
+                     [(style, self._generateSideShape(2 * self.outsideWidth, 0, False), 'right')],
+                     [(style, self._generateSideShape(2 * self.outsideWidth + self.outsideDepth, 0, False), 'left')]]
 
-        self._addTopShape('bottom', style, self.thickness, self.outsideHeight + self.thickness)
+        parts.append([(style, self._generateTopShape(self.thickness, self.outsideHeight + self.thickness), 'bottom')])
         if self.options.includeLid:
-            self._addTopShape('top', style, self.thickness + self.outsideWidth, self.outsideHeight + self.thickness)
+            parts.append([(style, self._generateTopShape(self.thickness + self.outsideWidth,
+                                                         self.outsideHeight + self.thickness), 'top')])
+        return parts
+
+    def _addParts(self, parts):
+        for shapes in parts:
+            for style, path, name in shapes:
+                self._addPathToDocumentTree(style, path, name)
+
+    def _getPartBoundingBox(self, shapes):
+        boxes = [path.getBoundingBox() for style, path, name in shapes]
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes), max(box[2] for box in boxes),
+                max(box[3] for box in boxes))
+
+    def _addNestedParts(self, parts):
+        """
+        Packs the parts onto sheets, see Nesting. Every sheet is added as a group with the outline of the sheet and
+        the material utilization in its label.
+        """
+        sheetWidth = self._conv(self.options.sheetWidth)
+        sheetHeight = self._conv(self.options.sheetHeight)
+        boundingBoxes = [self._getPartBoundingBox(shapes) for shapes in parts]
+        # the parts are packed in the unit of the options, so error messages use the same unit
+        unitSize = self._conv(1)
+        with self.span('nesting'):
+            placements, sheets = Nesting.packRectangles([((maxX - minX) / unitSize, (maxY - minY) / unitSize)
+                                                         for minX, minY, maxX, maxY in boundingBoxes],
+                                                        self.options.sheetWidth, self.options.sheetHeight,
+                                                        self.options.partSpacing, self.options.allowRotation)
+        # the sheets are laid out next to each other
+        sheetGap = self.unittouu('10mm')
+        sheetPaths = [[] for sheet in sheets]
+        for shapes, (minX, minY, maxX, maxY), (sheetIndex, x, y, isRotated) in zip(parts, boundingBoxes, placements):
+            x *= unitSize
+            y *= unitSize
+            offsetX = sheetIndex * (sheetWidth + sheetGap) + x
+            for style, path, name in shapes:
+                if isRotated:
+                    # after the rotation the part spans from -maxY to -minY horizontally
+                    path = path.rotated90().translated(offsetX + maxY, y - minX)
+                else:
+                    path = path.translated(offsetX - minX, y - minY)
+                sheetPaths[sheetIndex].append((style, path, name))
+
+        sheetStyle = simplestyle.formatStyle({'stroke': '#0000ff', 'stroke-width': str(self.linewidth),
+                                              'fill': 'none'})
+        sheetArea = self.options.sheetWidth * self.options.sheetHeight
+        usedArea = 0.0
+        for sheetIndex, sheet in enumerate(sheets):
+            sheetX = sheetIndex * (sheetWidth + sheetGap)
+            outline = SvgBasics.PathBuilder().moveAbs(sheetX, 0).lineRel(sheetWidth, 0).lineRel(0, sheetHeight) \
+                .lineRel(-sheetWidth, 0).close()
+            paths = [(sheetStyle, outline, 'outline')] if self.options.drawSheets else []
+            self._addPathsToDocumentTree(paths + sheetPaths[sheetIndex], 'sheet %d: %.1f %% used' %
+                                         (sheetIndex + 1, 100 * sheet.usedArea / sheetArea))
+            usedArea += sheet.usedArea
+        utilization = 100 * usedArea / (len(sheets) * sheetArea)
+        self._profiler.count('sheets', len(sheets))
+        self._profiler.count('utilization %', round(utilization, 1))
+        self.trace(SvgBasics.TRACE_INFO, '%d parts nested onto %d sheets, %.1f %% of the material is used',
+                   len(parts), len(sheets), utilization)
+
+    def _getShapeStyle(self):
+        return simplestyle.formatStyle({'stroke': '#000000', 'stroke-width': str(self.linewidth), 'fill': '#808080'})
+
+    def _generateManifestBoxes(self, manifestFile):
+        """
+        Returns (name, parts, count) for each box of the manifest, a CSV or JSON file as read by BatchRunner. Each
+        entry sets the options of one box, options it does not contain are taken from the dialog. The key "name"
+        labels the box, boxCount is the number of copies.
+        """
+        runOptions = self.options
+        boxes = []
+        try:
+            for index, entry in enumerate(BatchRunner.readManifest(os.path.expanduser(manifestFile))):
+                name = entry.pop('name', None) or 'box %d' % (index + 1)
+                for key in entry:
+                    if not self.OptionParser.has_option('--' + key):
+                        raise Exception('Unknown option "' + str(key) + '" for ' + name + ' in the manifest')
+                # the options are parsed like the options of the dialog, so they are converted and checked the same way
+                self.options = self.OptionParser.parse_args(BatchRunner.toArguments(entry), copy.copy(runOptions))[0]
+                self._calculateDimensions()
+                boxes.append((name, self._generateParts(self._getShapeStyle()), self.options.boxCount))
+        finally:
+            self.options = runOptions
+        self._profiler.count('boxes', sum(count for name, parts, count in boxes))
+        self.trace(SvgBasics.TRACE_INFO, '%d boxes generated with %d distinct indented edges', len(boxes),
+                   len(self._indentedEdges))
+        return boxes
+
+    def _addBoxGroups(self, boxes):
+        """Adds every box as a group of its own, the boxes are placed below each other."""
+        boxGap = self.unittouu('10mm')
+        offsetY = 0.0
+        for name, parts, count in boxes:
+            minX, minY, maxX, maxY = self._getPartBoundingBox([shape for shapes in parts for shape in shapes])
+            for copyIndex in xrange(count):
+                self._addPathsToDocumentTree([(style, path.translated(-minX, offsetY - minY), shapeName)
+                                              for shapes in parts for style, path, shapeName in shapes],
+                                             name if count == 1 else '%s (%d)' % (name, copyIndex + 1))
+                offsetY += maxY - minY + boxGap
+
+    def effect(self):
+        if self.options.manifest:
+            boxes = self._generateManifestBoxes(self.options.manifest)
+            if self.options.nesting:
+                # the outlines of the sheets are drawn with the line width of the dialog
+                self.linewidth = self._conv(self.options.linewidth)
+                self._addNestedParts([shapes for name, parts, count in boxes for shapes in parts * count])
+            else:
+                self._addBoxGroups(boxes)
+            return
+
+        self._calculateDimensions()
+        parts = self._generateParts(self._getShapeStyle())
+        if self.options.nesting:
+            self._addNestedParts(parts * self.options.boxCount)
+        else:
+            self._addParts(parts)
 
 
-# Create effect instance and apply it.
-effect = LaserBox()
-effect.affect()
+if __name__ == '__main__':
+    # Create effect instance and apply it.
+    effect = LaserBox()
+    effect.affect()
@@ -18,11 +18,36 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import math
 
+import PathChaining
 import SvgBasics
 import simplestyle
 
+try:
+    import numpy
+except ImportError:
+    # the columns of gradient hinges are computed one after the other
+    numpy = None
+
 __version__ = "0.1"
 
+# curves for gradient hinges: weight (0 = base values, 1 = peak values) at the relative position t (0 to 1) of a
+# column; m is either the math or the numpy module, so the curves can be evaluated for all columns at once
+GRADIENT_CURVES = {
+    'linear': lambda t, m: t,
+    'center': lambda t, m: 1 - abs(2 * t - 1),
+    'smooth': lambda t, m: (1 - m.cos(2 * m.pi * t)) / 2,
+}
+
+
+def getGradientWeights(curveName, count, useNumpy):
+    """Returns the weights of the gradient curve for count columns, as NumPy array or as list."""
+    curve = GRADIENT_CURVES[curveName]
+    denominator = float(max(count - 1, 1))
+    if useNumpy:
+        return curve(numpy.arange(count) / denominator, numpy)
+    return [curve(index / denominator, math) for index in xrange(count)]
+
+
 class Dimensions(object):
     def __init__(self, inksVoffset, inksLength, inksWidth, inksVspacing):
         self.inksVoffset = inksVoffset
@@ -51,15 +76,39 @@ class LatticeLivingHinges(SvgBasics.BaseEffectExtension):
         self._hSpacing0 = None
         self._hSpacing1 = None
 
-    def _handleOption(self, param, paramName):
+    def _handleOption(self, optionSpec, paramName):
         if paramName == 'active-tab':
             self.OptionParser.add_option('--active-tab', action='store', dest='___unused')
         return paramName == 'active-tab'    
         
     def _isBottomReached(self, absoluteY):
-        self.log({'absoluteY':absoluteY, 'self._hingeHeight':self._hingeHeight, 'self._epsilon':self._epsilon,
-                  'retval:':absoluteY >= self._hingeHeight - self._epsilon})
-        return absoluteY >= self._hingeHeight - self._epsilon
+        isReached = absoluteY >= self._hingeHeight - self._epsilon
+        if self._traceLevel >= SvgBasics.TRACE_VERBOSE:
+            self.trace(SvgBasics.TRACE_VERBOSE, 'absoluteY %s, hinge height %s, epsilon %s: bottom reached %s',
+                       absoluteY, self._hingeHeight, self._epsilon, isReached)
+        return isReached
+
+    def _countFullPeriods(self, inksCurrentY, dimensions):
+        """
+        Returns the number of periods starting at inksCurrentY, which end above the bottom of the hinge, i.e. the
+        number of steps of a column that are not clipped at the bottom.
+        """
+        periods = int(math.ceil((self._hingeHeight - self._epsilon - inksCurrentY) / dimensions.totalHeight)) - 1
+        return max(periods, 0)
+
+    def _addFullPeriods(self, cut, inksCurrentY, dimensions, addStep):
+        """
+        Appends all steps of a column that are not clipped at the bottom. The column is periodic, so only the first
+        step is generated with addStep(cut, inksCurrentY), the others are copies of it. Returns the y coordinate after
+        the last of these steps.
+        """
+        periods = self._countFullPeriods(inksCurrentY, dimensions)
+        if periods > 0:
+            period = SvgBasics.PathBuilder()
+            addStep(period, inksCurrentY)
+            cut.extendRepeated(period, periods)
+            inksCurrentY += periods * dimensions.totalHeight
+        return inksCurrentY
 
     ####################################################################################
     # Code for hairlines
@@ -67,30 +116,34 @@ class LatticeLivingHinges(SvgBasics.BaseEffectExtension):
     def _addHairlineCutAndVspacing(self, cut, inksCurrentY, cutLength, vSpacing):
         if self._isBottomReached(inksCurrentY + cutLength):
             cutLength = self._hingeHeight - inksCurrentY
-        cut += SvgBasics.lineRel(0, cutLength)
+        cut.lineRel(0, cutLength)
         inksCurrentY += cutLength
         if self._isBottomReached(inksCurrentY + vSpacing):
             vSpacing = self._hingeHeight - inksCurrentY
-        cut += SvgBasics.moveRel(0, vSpacing)
+        cut.moveRel(0, vSpacing)
         inksCurrentY += vSpacing
         return inksCurrentY, cut
 
     def _createHairlines(self, dimensions):
         inksCurrentY = 0
-        cut = ''
+        cut = SvgBasics.PathBuilder()
         if -dimensions.inksVoffset > dimensions.inksLength:
             inksCurrentY = dimensions.totalHeight + dimensions.inksVoffset
-            cut = SvgBasics.moveRel(0, inksCurrentY)
+            cut.moveRel(0, inksCurrentY)
         else:
             initialCutLength = dimensions.inksLength + dimensions.inksVoffset
             inksCurrentY, cut = self._addHairlineCutAndVspacing(cut, inksCurrentY, initialCutLength, dimensions.inksVspacing)
+        inksCurrentY = self._addFullPeriods(cut, inksCurrentY, dimensions,
+                                            lambda period, y: self._addHairlineCutAndVspacing(
+                                                period, y, dimensions.inksLength, dimensions.inksVspacing))
+        # the clipped tail
         while not self._isBottomReached(inksCurrentY):
             inksCurrentY, cut = self._addHairlineCutAndVspacing(cut, inksCurrentY, dimensions.inksLength,
                                                             dimensions.inksVspacing)
         return cut
     ####################################################################################
 
-    def _createArcCutoff(self, availableHeight, dimensions, isDirIncX, isDirIncY):
+    def _createArcCutoff(self, cut, availableHeight, dimensions, isDirIncX, isDirIncY):
 
         x = dimensions.inksRadius - math.sqrt(
             dimensions.inksRadius * dimensions.inksRadius - availableHeight * availableHeight)
@@ -100,12 +153,12 @@ class LatticeLivingHinges(SvgBasics.BaseEffectExtension):
             cutoffWidth *= -1
         if not isDirIncY:
             availableHeight *= -1
-        cut = SvgBasics.circRel(dimensions.inksRadius, False, False, x, availableHeight)
+        cut.circRel(dimensions.inksRadius, False, False, x, availableHeight)
         if self.options.drawBorders:
-            cut += SvgBasics.moveRel(cutoffWidth, 0)
+            cut.moveRel(cutoffWidth, 0)
         else:
-            cut += SvgBasics.lineRel(cutoffWidth, 0)
-        cut += SvgBasics.circRel(dimensions.inksRadius, False, False, x, -availableHeight)
+            cut.lineRel(cutoffWidth, 0)
+        cut.circRel(dimensions.inksRadius, False, False, x, -availableHeight)
         return cut
 
     def _createWideCuts(self, dimensions):
@@ -113,77 +166,173 @@ class LatticeLivingHinges(SvgBasics.BaseEffectExtension):
         Generates a single column of wide cuts. Wide cuts start below the top arc on the left side with a
         downward line and continue with the bottom arc, an upward line and the top arc.
         """
-        cut = ''
+        cut = SvgBasics.PathBuilder()
         if -dimensions.inksVoffset > dimensions.inksLength:
             # first cut would be completely hidden
             inksCurrentY = dimensions.inksLength + dimensions.inksVspacing + dimensions.inksRadius + \
                            dimensions.inksVoffset
-            cut += SvgBasics.moveRel(0, inksCurrentY)
+            cut.moveRel(0, inksCurrentY)
         elif -dimensions.inksVoffset > dimensions.inksLengthWithoutRadii + dimensions.inksRadius:
             # only bottom arc is visible
             arcCenterY = dimensions.inksVoffset + dimensions.inksLengthWithoutRadii + dimensions.inksRadius
             arcStartX = dimensions.inksRadius - math.sqrt(dimensions.inksRadius * dimensions.inksRadius -
                                                           arcCenterY * arcCenterY)
             arcRelEndX = dimensions.inksWidth - 2 * arcStartX
-            cut += SvgBasics.moveRel(arcStartX, 0)
-            cut += SvgBasics.circRel(dimensions.inksRadius, False, False, arcRelEndX, 0)
+            cut.moveRel(arcStartX, 0)
+            cut.circRel(dimensions.inksRadius, False, False, arcRelEndX, 0)
             inksCurrentY = 2 * dimensions.inksRadius + arcCenterY + dimensions.inksVspacing
             if self.options.drawBorders:
-                cut += SvgBasics.moveRel(-arcStartX-arcRelEndX, inksCurrentY)
+                cut.moveRel(-arcStartX-arcRelEndX, inksCurrentY)
             else:
-                cut += ' z ' + SvgBasics.moveRel(-arcStartX, inksCurrentY)
+                cut.close().moveRel(-arcStartX, inksCurrentY)
         elif -dimensions.inksVoffset > dimensions.inksRadius:
             cutLength = dimensions.inksLengthWithoutRadii + dimensions.inksRadius + dimensions.inksVoffset
-            cut += SvgBasics.lineRel(0, cutLength)
-            cut += SvgBasics.circRel(dimensions.inksRadius, True, False, dimensions.inksWidth, 0)
-            cut += SvgBasics.lineRel(0, -cutLength)
+            cut.lineRel(0, cutLength)
+            cut.circRel(dimensions.inksRadius, True, False, dimensions.inksWidth, 0)
+            cut.lineRel(0, -cutLength)
             inksCurrentY = cutLength + 2 * dimensions.inksRadius + dimensions.inksVspacing
             if self.options.drawBorders:
-                cut += SvgBasics.moveRel(-dimensions.inksWidth, inksCurrentY)
+                cut.moveRel(-dimensions.inksWidth, inksCurrentY)
             else:
-                cut += ' z ' + SvgBasics.moveRel(0, inksCurrentY)
+                cut.close().moveRel(0, inksCurrentY)
         else:
             inksCurrentY = dimensions.inksRadius + dimensions.inksVoffset
-            cut += SvgBasics.moveRel(0, inksCurrentY)
+            cut.moveRel(0, inksCurrentY)
+        if inksCurrentY < dimensions.inksRadius and not self._isBottomReached(inksCurrentY):
+            # the top arc of the first cut is clipped
+            inksCurrentY = self._addWideCut(cut, inksCurrentY, dimensions)
+        inksCurrentY = self._addFullPeriods(cut, inksCurrentY, dimensions,
+                                            lambda period, y: self._addWideCut(period, y, dimensions))
+        # the clipped tail
         while not self._isBottomReached(inksCurrentY):
-            if self._isBottomReached(inksCurrentY + dimensions.inksLengthWithoutRadii):
-                cutLength = self._hingeHeight - inksCurrentY
-                cut += SvgBasics.lineRel(0, cutLength)
-                cut += SvgBasics.moveRel(dimensions.inksWidth, 0) if self.options.drawBorders else SvgBasics.lineRel(dimensions.inksWidth, 0)
-                cut += SvgBasics.lineRel(0, -cutLength)
-            else:
-                cut += SvgBasics.lineRel(0, dimensions.inksLengthWithoutRadii)
-                if self._isBottomReached(inksCurrentY + dimensions.inksLengthWithoutRadii + dimensions.inksRadius):
-                    availableHeight = self._hingeHeight - (inksCurrentY + dimensions.inksLengthWithoutRadii)
-                    cut += self._createArcCutoff(availableHeight, dimensions, True, True)
-                else:
-                    cut += SvgBasics.circRel(dimensions.inksRadius, True, False, dimensions.inksWidth, 0)
-                cut += SvgBasics.lineRel(0, -dimensions.inksLengthWithoutRadii)
-            if inksCurrentY < dimensions.inksRadius:
-                cut += self._createArcCutoff(inksCurrentY, dimensions, False, False)
+            inksCurrentY = self._addWideCut(cut, inksCurrentY, dimensions)
+        return cut
+
+    def _addWideCut(self, cut, inksCurrentY, dimensions):
+        """
+        Appends a wide cut starting at inksCurrentY (the center of its top arc) and the move to the next cut.
+        Returns the y coordinate of the next cut.
+        """
+        if self._isBottomReached(inksCurrentY + dimensions.inksLengthWithoutRadii):
+            cutLength = self._hingeHeight - inksCurrentY
+            cut.lineRel(0, cutLength)
+            if self.options.drawBorders:
+                cut.moveRel(dimensions.inksWidth, 0)
             else:
-                cut += SvgBasics.circRel(dimensions.inksRadius, True, False, -dimensions.inksWidth, 0)
-            if not self.options.drawBorders:
-                cut += ' z '
-            if self._isBottomReached(inksCurrentY + dimensions.totalHeight):
-                # the top arc of the next cut might still be visible
-                if not self._isBottomReached(inksCurrentY + dimensions.totalHeight - dimensions.inksRadius):
-                    arcCenterY = inksCurrentY + dimensions.totalHeight - self._hingeHeight
-                    arcStartX = dimensions.inksRadius - math.sqrt(dimensions.inksRadius * dimensions.inksRadius -
-                                                                  arcCenterY * arcCenterY)
-                    arcRelEndX = dimensions.inksWidth - 2 * arcStartX
-                    cut += SvgBasics.moveRel(arcStartX, self._hingeHeight - inksCurrentY)
-                    cut += SvgBasics.circRel(dimensions.inksRadius, False, True, arcRelEndX, 0)
-                    if not self.options.drawBorders:
-                        cut += ' z '
+                cut.lineRel(dimensions.inksWidth, 0)
+            cut.lineRel(0, -cutLength)
+        else:
+            cut.lineRel(0, dimensions.inksLengthWithoutRadii)
+            if self._isBottomReached(inksCurrentY + dimensions.inksLengthWithoutRadii + dimensions.inksRadius):
+                availableHeight = self._hingeHeight - (inksCurrentY + dimensions.inksLengthWithoutRadii)
+                self._createArcCutoff(cut, availableHeight, dimensions, True, True)
             else:
-                cut += SvgBasics.moveRel(0, dimensions.totalHeight)
-            inksCurrentY += dimensions.totalHeight
-        return cut
+                cut.circRel(dimensions.inksRadius, True, False, dimensions.inksWidth, 0)
+            cut.lineRel(0, -dimensions.inksLengthWithoutRadii)
+        if inksCurrentY < dimensions.inksRadius:
+            self._createArcCutoff(cut, inksCurrentY, dimensions, False, False)
+        else:
+            cut.circRel(dimensions.inksRadius, True, False, -dimensions.inksWidth, 0)
+        if not self.options.drawBorders:
+            cut.close()
+        if self._isBottomReached(inksCurrentY + dimensions.totalHeight):
+            # the top arc of the next cut might still be visible
+            if not self._isBottomReached(inksCurrentY + dimensions.totalHeight - dimensions.inksRadius):
+                arcCenterY = inksCurrentY + dimensions.totalHeight - self._hingeHeight
+                arcStartX = dimensions.inksRadius - math.sqrt(dimensions.inksRadius * dimensions.inksRadius -
+                                                              arcCenterY * arcCenterY)
+                arcRelEndX = dimensions.inksWidth - 2 * arcStartX
+                cut.moveRel(arcStartX, self._hingeHeight - inksCurrentY)
+                cut.circRel(dimensions.inksRadius, False, True, arcRelEndX, 0)
+                if not self.options.drawBorders:
+                    cut.close()
+        else:
+            cut.moveRel(0, dimensions.totalHeight)
+        return inksCurrentY + dimensions.totalHeight
 
     def _createCutString(self, dimensions):
         return self._createHairlines(dimensions) if self.options.useHairlines else self._createWideCuts(dimensions)
 
+    def _generateColumns(self, style, cuts, placements):
+        """Yields the paths of all columns, so they can be written while they are generated."""
+        for index, x, y in placements:
+            yield (style, SvgBasics.PathBuilder().moveAbs(x, y).extend(cuts[index]))
+
+    def _createCombinedColumns(self, cuts, placements):
+        """
+        Returns a single path with all columns. Every second column is reversed, so the laser cuts the columns
+        alternately downwards and upwards and only moves sideways between them.
+        """
+        columns = [path for style, path in self._generateColumns(None, cuts, placements)]
+        combined = SvgBasics.PathBuilder()
+        for index, column in enumerate(columns):
+            combined.extend(column.reversed() if index % 2 == 1 else column)
+        travelBefore = PathChaining.getPathTravelDistance(columns)
+        travelAfter = PathChaining.getPathTravelDistance([combined])
+        self._profiler.count('travel before', round(travelBefore, 3))
+        self._profiler.count('travel after', round(travelAfter, 3))
+        self.trace(SvgBasics.TRACE_INFO, 'travel distance %.3f before, %.3f after combining, %.3f saved', travelBefore,
+                   travelAfter, travelBefore - travelAfter)
+        return combined
+
+    def _generateColumnPlacements(self):
+        """Yields (template index, x, y) of all columns, the odd columns use template 0, the even ones template 1."""
+        currentX = 0
+        for x in xrange(0, self.options.count_cuts):
+            yield (0, currentX, 0)
+            currentX += self._hSpacing0
+            yield (1, currentX, 0)
+            currentX += self._hSpacing1
+
+    def _getColumnParameters(self, weights, isOdd, select):
+        """
+        Returns (voffset, length, width, vspacing, hspacing) of gradient columns in user units. Works on single
+        values as well as on NumPy arrays with the values of all columns; select(isOdd, oddValue, evenValue) picks
+        the base value of the column.
+        """
+        options = self.options
+        length = select(isOdd, self._conv(options.length0), self._conv(options.length1))
+        vspacing = select(isOdd, self._conv(options.vspacing0), self._conv(options.vspacing1))
+        voffset = select(isOdd, self._conv(options.voffset0), self._conv(options.voffset1))
+        hspacing = select(isOdd, self._conv(options.hspacing0), self._conv(options.hspacing1))
+        width = 0 if options.useHairlines else select(isOdd, self._conv(options.width0), self._conv(options.width1))
+        gradientLength = length * (1 + (options.gradientLength - 1) * weights)
+        gradientVspacing = vspacing * (1 + (options.gradientVspacing - 1) * weights)
+        gradientHspacing = hspacing * (1 + (options.gradientHspacing - 1) * weights)
+        # the offset is scaled with the period, so the cuts of neighbouring columns stay staggered the same way
+        gradientVoffset = voffset * (gradientLength + gradientVspacing) / (length + vspacing)
+        return gradientVoffset, gradientLength, width, gradientVspacing, gradientHspacing
+
+    def _createGradientColumns(self, useNumpy):
+        """
+        Returns (cuts, placements, total width) of a hinge whose cut length and spacing follow the gradient curve.
+        The parameters of all columns are computed at once; columns with identical parameters share their cuts.
+        """
+        count = self.options.gradientColumns or 2 * self.options.count_cuts
+        weights = getGradientWeights(self.options.gradient, count, useNumpy)
+        if useNumpy:
+            columnParameters = zip(*[numpy.broadcast_to(values, (count,)).tolist() for values in
+                                     self._getColumnParameters(weights, numpy.arange(count) % 2 == 0, numpy.where)])
+        else:
+            columnParameters = [self._getColumnParameters(weight, index % 2 == 0,
+                                                          lambda isOdd, oddValue, evenValue:
+                                                          oddValue if isOdd else evenValue)
+                                for index, weight in enumerate(weights)]
+        cuts = []
+        cutIndices = {}
+        placements = []
+        currentX = 0
+        for voffset, length, width, vspacing, hspacing in columnParameters:
+            key = tuple(round(value, 9) for value in (voffset, length, width, vspacing))
+            cutIndex = cutIndices.get(key)
+            if cutIndex is None:
+                cutIndex = cutIndices[key] = len(cuts)
+                cuts.append(self._createCutString(Dimensions(voffset, length, width, vspacing)))
+            placements.append((cutIndex, currentX, 0))
+            currentX += hspacing + width
+        self._profiler.count('distinct columns', len(cuts))
+        return cuts, placements, currentX
+
     def _getInkscapeMeasures(self, voffset, length, width, vspacing):
         inksWidth = 0 if self.options.useHairlines else self._conv(width)
         inksLength = self._conv(length)
@@ -197,33 +346,44 @@ class LatticeLivingHinges(SvgBasics.BaseEffectExtension):
         self._lineWidth = self.unittouu("0.01mm")
 
         self._hingeHeight = self._conv(self.options.hinge_height)
-        dimensions0 = self._getInkscapeMeasures(self.options.voffset0, self.options.length0, self.options.width0,
-                                                self.options.vspacing0)
         # TODO Add some sanity checks, e.g. cutWidth < cutLength, cutLength <= hinge height
-        oddCuts = self._createCutString(dimensions0)
-
-        dimensions1 = self._getInkscapeMeasures(self.options.voffset1, self.options.length1, self.options.width1,
-                                                self.options.vspacing1)
-        evenCuts = self._createCutString(dimensions1)
-
         self._hSpacing0 = self._conv(self.options.hspacing0)
         self._hSpacing1 = self._conv(self.options.hspacing1)
         if not self.options.useHairlines:
             self._hSpacing0 += self._conv(self.options.width0)
             self._hSpacing1 += self._conv(self.options.width1)
+        with self.span('columns'):
+            if self.options.gradient != 'none':
+                useNumpy = numpy is not None and self.options.useNumpy
+                cuts, placements, totalWidth = self._createGradientColumns(useNumpy)
+            else:
+                dimensions0 = self._getInkscapeMeasures(self.options.voffset0, self.options.length0,
+                                                        self.options.width0, self.options.vspacing0)
+                oddCuts = self._createCutString(dimensions0)
+
+                dimensions1 = self._getInkscapeMeasures(self.options.voffset1, self.options.length1,
+                                                        self.options.width1, self.options.vspacing1)
+                evenCuts = self._createCutString(dimensions1)
+                cuts = [oddCuts, evenCuts]
+                placements = list(self._generateColumnPlacements())
+                totalWidth = self.options.count_cuts * (self._hSpacing0 + self._hSpacing1)
+
         style = simplestyle.formatStyle(
             {'stroke': '#000000', 'stroke-width': str(self._lineWidth), 'fill': 'none', 'stroke-linecap': 'round'})
-        currentX = 0
-        for x in xrange(0, self.options.count_cuts):
-            self._addPathToDocumentTree(style, 'M ' + str(currentX) + ',0' + oddCuts)
-            currentX += self._hSpacing0
-            self._addPathToDocumentTree(style, 'M ' + str(currentX) + ',0' + evenCuts)
-            currentX += self._hSpacing1
+        if self.options.combineLines:
+            self._addPathToDocumentTree(style, self._createCombinedColumns(cuts, placements), 'Living hinge')
+        elif self.options.columnOutput == 'clones':
+            # every column is a <use> of one of the distinct column paths
+            templates = [(style, SvgBasics.PathBuilder().moveAbs(0, 0).extend(cut)) for cut in cuts]
+            self._addUsesToDocumentTree(templates, placements, 'Living hinge')
+        else:
+            self._addPathsToDocumentTree(self._generateColumns(style, cuts, placements), 'Living hinge')
         if self.options.drawBorders:
-            self._addPathToDocumentTree(style, 'M 0,0 ' + SvgBasics.lineRel(currentX, 0) +
-                                        SvgBasics.moveRel(0, self._hingeHeight) + SvgBasics.lineRel(-currentX, 0))
+            self._addPathToDocumentTree(style, SvgBasics.PathBuilder().moveAbs(0, 0).lineRel(totalWidth, 0)
+                                        .moveRel(0, self._hingeHeight).lineRel(-totalWidth, 0))
 
 
-# Create effect instance and apply it.
-effect = LatticeLivingHinges()
-effect.affect()
+if __name__ == '__main__':
+    # Create effect instance and apply it.
+    effect = LatticeLivingHinges()
+    effect.affect()
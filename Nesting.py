@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Packs rectangular parts (e.g. the bounding boxes of the parts of a box) onto sheets of material.
+
+The parts are placed with the MaxRects algorithm: every sheet keeps the list of maximal free rectangles. A part is
+put into the free rectangle that leaves the shortest remaining side (best short side fit), optionally rotated by 90
+degrees. The parts are placed from the biggest to the smallest, each on the first sheet it fits onto; a new sheet is
+only started if none of the sheets has room left.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# tolerance for comparing sizes, parts that are as big as the free space fit in spite of rounding errors
+EPSILON = 1e-9
+
+
+class Sheet(object):
+    """
+    The free rectangles (x, y, width, height) left on a sheet. usedArea is maintained by packRectangles, it is the
+    area of the placed rectangles without their spacing.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.usedArea = 0.0
+        self._freeRectangles = [(0.0, 0.0, width, height)]
+
+    def findPosition(self, width, height, allowRotation):
+        """
+        Returns ((short side, long side), x, y, isRotated) of the best position of a part or None, if it does not
+        fit. The first tuple is the score, smaller is better.
+        """
+        best = None
+        orientations = [(width, height, False)]
+        if allowRotation and abs(width - height) > EPSILON:
+            orientations.append((height, width, True))
+        for freeX, freeY, freeWidth, freeHeight in self._freeRectangles:
+            for partWidth, partHeight, isRotated in orientations:
+                if partWidth > freeWidth + EPSILON or partHeight > freeHeight + EPSILON:
+                    continue
+                leftoverX = freeWidth - partWidth
+                leftoverY = freeHeight - partHeight
+                score = (min(leftoverX, leftoverY), max(leftoverX, leftoverY))
+                if best is None or score < best[0]:
+                    best = (score, freeX, freeY, isRotated)
+        return best
+
+    def place(self, x, y, width, height):
+        """Marks the rectangle as used. It has to lie within the free space, see findPosition."""
+        newRectangles = []
+        for rectangle in self._freeRectangles:
+            freeX, freeY, freeWidth, freeHeight = rectangle
+            if x >= freeX + freeWidth - EPSILON or x + width <= freeX + EPSILON or \
+                    y >= freeY + freeHeight - EPSILON or y + height <= freeY + EPSILON:
+                newRectangles.append(rectangle)
+                continue
+            # the maximal rectangles of the free rectangle left, right, above and below the placed one
+            if x > freeX + EPSILON:
+                newRectangles.append((freeX, freeY, x - freeX, freeHeight))
+            if x + width < freeX + freeWidth - EPSILON:
+                newRectangles.append((x + width, freeY, freeX + freeWidth - x - width, freeHeight))
+            if y > freeY + EPSILON:
+                newRectangles.append((freeX, freeY, freeWidth, y - freeY))
+            if y + height < freeY + freeHeight - EPSILON:
+                newRectangles.append((freeX, y + height, freeWidth, freeY + freeHeight - y - height))
+        self._freeRectangles = removeContainedRectangles(newRectangles)
+
+
+def isContained(inner, outer):
+    return inner[0] >= outer[0] - EPSILON and inner[1] >= outer[1] - EPSILON and \
+        inner[0] + inner[2] <= outer[0] + outer[2] + EPSILON and inner[1] + inner[3] <= outer[1] + outer[3] + EPSILON
+
+
+def removeContainedRectangles(rectangles):
+    """Returns the rectangles that are not contained in another one (of identical rectangles one is kept)."""
+    # big rectangles first, so a rectangle can only be contained in one of the rectangles before it
+    rectangles = sorted(rectangles, key=lambda rectangle: -rectangle[2] * rectangle[3])
+    kept = []
+    for rectangle in rectangles:
+        if not any(isContained(rectangle, other) for other in kept):
+            kept.append(rectangle)
+    return kept
+
+
+def packRectangles(sizes, sheetWidth, sheetHeight, spacing=0.0, allowRotation=True):
+    """
+    Places rectangles of the given sizes (width, height) on sheets. The rectangles keep the spacing to each other and
+    to the border of the sheet. Returns (placements, sheets): placements contains (sheet index, x, y, isRotated) for
+    each size in the order of sizes, x and y are the upper left corner of the rectangle (after the rotation).
+    sheets is the list of Sheet objects, their usedArea is the area of the placed rectangles.
+    """
+    # the rectangles are enlarged by the spacing, the sheet reduced by the spacing at its upper and left border
+    usableWidth = sheetWidth - spacing
+    usableHeight = sheetHeight - spacing
+    order = sorted(xrange(len(sizes)), key=lambda index: (-max(sizes[index]), -sizes[index][0] * sizes[index][1]))
+    placements = [None] * len(sizes)
+    sheets = []
+    for index in order:
+        width, height = sizes[index]
+        for sheetIndex, sheet in enumerate(sheets):
+            position = sheet.findPosition(width + spacing, height + spacing, allowRotation)
+            if position is not None:
+                break
+        else:
+            sheet = Sheet(usableWidth, usableHeight)
+            position = sheet.findPosition(width + spacing, height + spacing, allowRotation)
+            if position is None:
+                raise Exception('A part of %g x %g does not fit onto a sheet of %g x %g' % (width, height, sheetWidth,
+                                                                                          sheetHeight))
+            sheets.append(sheet)
+            sheetIndex = len(sheets) - 1
+        score, x, y, isRotated = position
+        if isRotated:
+            width, height = height, width
+        sheet.place(x, y, width + spacing, height + spacing)
+        # the used area only counts the rectangles themselves
+        sheet.usedArea += width * height
+        placements[index] = (sheetIndex, x + spacing, y + spacing, isRotated)
+    return placements, sheets
@@ -0,0 +1,196 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Joins line segments into long polylines and orders them, so a laser cutter has to do fewer and shorter moves with
+the laser turned off.
+
+The segments are the edges of a graph whose nodes are the end points. Starting at a node with an odd number of
+remaining edges (such a trail can only end at another node with an odd number of edges) the trail is followed until
+there is no unused edge left at the current node. The next trail is started at the nearest suitable node. If only
+nodes with an even number of remaining edges are left, the remaining edges form cycles, which are handled the same
+way.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+# end points are considered equal, if their coordinates are equal when rounded to this number of decimal places
+KEY_PRECISION = 6
+
+
+def getTravelDistance(polylines):
+    """Returns the length of the moves from the end of each polyline to the start of the next one."""
+    distance = 0.0
+    for index in xrange(1, len(polylines)):
+        endX, endY = polylines[index - 1][-1]
+        startX, startY = polylines[index][0]
+        distance += math.hypot(startX - endX, startY - endY)
+    return distance
+
+
+def getSegmentTravelDistance(segments):
+    """Returns the travel distance for drawing the segments (startX, startY, endX, endY) one after the other."""
+    distance = 0.0
+    for index in xrange(1, len(segments)):
+        distance += math.hypot(segments[index][0] - segments[index - 1][2], segments[index][1] - segments[index - 1][3])
+    return distance
+
+
+def getPathTravelDistance(paths):
+    """
+    Returns the travel distance for cutting the PathBuilders one after the other: the moves from the end of each
+    drawn subpath to the start of the next one.
+    """
+    distance = 0.0
+    lastPoint = None
+    for path in paths:
+        for startPoint, endPoint in path.getDrawnExtents():
+            if lastPoint is not None:
+                distance += math.hypot(startPoint[0] - lastPoint[0], startPoint[1] - lastPoint[1])
+            lastPoint = endPoint
+    return distance
+
+
+class PointGrid(object):
+    """
+    A uniform grid of buckets for finding the nearest of a set of points. Points are identified by their index in
+    the lists of coordinates. Points can be excluded from the search with a predicate, they are then removed from
+    the grid.
+    """
+    def __init__(self, xs, ys, cellSize):
+        self._xs = xs
+        self._ys = ys
+        self._cellSize = float(cellSize)
+        self._cells = {}
+        self._size = 0
+
+    def _getCell(self, x, y):
+        return (int(math.floor(x / self._cellSize)), int(math.floor(y / self._cellSize)))
+
+    def add(self, index):
+        self._cells.setdefault(self._getCell(self._xs[index], self._ys[index]), []).append(index)
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def _getRing(self, cellX, cellY, radius):
+        if radius == 0:
+            yield (cellX, cellY)
+            return
+        for x in xrange(cellX - radius, cellX + radius + 1):
+            yield (x, cellY - radius)
+            yield (x, cellY + radius)
+        for y in xrange(cellY - radius + 1, cellY + radius):
+            yield (cellX - radius, y)
+            yield (cellX + radius, y)
+
+    def nearest(self, x, y, isValid):
+        """Returns the index of the valid point nearest to (x, y) or None. Invalid points are removed."""
+        cellX, cellY = self._getCell(x, y)
+        best = None
+        bestDistance = None
+        radius = 0
+        while self._size > 0:
+            # all points outside of the rings searched so far are at least this far away
+            if best is not None and bestDistance <= radius * self._cellSize:
+                break
+            for cell in self._getRing(cellX, cellY, radius):
+                indices = self._cells.get(cell)
+                if not indices:
+                    continue
+                valid = [index for index in indices if isValid(index)]
+                self._size -= len(indices) - len(valid)
+                if valid:
+                    self._cells[cell] = valid
+                else:
+                    del self._cells[cell]
+                for index in valid:
+                    distance = math.hypot(self._xs[index] - x, self._ys[index] - y)
+                    if best is None or distance < bestDistance:
+                        best = index
+                        bestDistance = distance
+            radius += 1
+        return best
+
+
+def chainSegments(segments, keys=None):
+    """
+    Joins the segments (startX, startY, endX, endY) into polylines, i.e. lists of (x, y). keys are optional pairs of
+    hashable keys identifying the start and end point of each segment, e.g. exact coordinates; by default the
+    rounded coordinates are used. Segments are expected to be distinct.
+    """
+    if keys is None:
+        keys = [((round(x1, KEY_PRECISION), round(y1, KEY_PRECISION)),
+                 (round(x2, KEY_PRECISION), round(y2, KEY_PRECISION))) for x1, y1, x2, y2 in segments]
+    # the nodes of the graph and the edges at each node
+    nodeIndices = {}
+    xs = []
+    ys = []
+    edges = []
+    edgeEnds = []
+    for (x1, y1, x2, y2), (startKey, endKey) in zip(segments, keys):
+        ends = []
+        for key, x, y in ((startKey, x1, y1), (endKey, x2, y2)):
+            node = nodeIndices.get(key)
+            if node is None:
+                node = nodeIndices[key] = len(xs)
+                xs.append(x)
+                ys.append(y)
+                edges.append([])
+            ends.append(node)
+        edges[ends[0]].append(len(edgeEnds))
+        edges[ends[1]].append(len(edgeEnds))
+        edgeEnds.append(ends)
+    if not edgeEnds:
+        return []
+
+    isUsed = [False] * len(edgeEnds)
+    remaining = [len(nodeEdges) for nodeEdges in edges]
+    # about one node per cell
+    width = max(xs) - min(xs)
+    height = max(ys) - min(ys)
+    cellSize = math.sqrt(width * height / len(xs)) if width > 0 and height > 0 else max(width, height, 1.0)
+    oddNodes = PointGrid(xs, ys, cellSize)
+    allNodes = PointGrid(xs, ys, cellSize)
+    for node in xrange(len(xs)):
+        if remaining[node] % 2 == 1:
+            oddNodes.add(node)
+        allNodes.add(node)
+
+    polylines = []
+    x, y = segments[0][0], segments[0][1]
+    while True:
+        # a trail only reduces the number of edges of its start node by one, so the start node becomes even
+        node = oddNodes.nearest(x, y, lambda index: remaining[index] % 2 == 1)
+        if node is None:
+            node = allNodes.nearest(x, y, lambda index: remaining[index] > 0)
+            if node is None:
+                break
+        polyline = [(xs[node], ys[node])]
+        while remaining[node] > 0:
+            nodeEdges = edges[node]
+            edge = nodeEdges.pop()
+            while isUsed[edge]:
+                edge = nodeEdges.pop()
+            isUsed[edge] = True
+            startNode, endNode = edgeEnds[edge]
+            nextNode = endNode if startNode == node else startNode
+            remaining[node] -= 1
+            remaining[nextNode] -= 1
+            node = nextNode
+            polyline.append((xs[node], ys[node]))
+        polylines.append(polyline)
+        x, y = polyline[-1]
+    return polylines
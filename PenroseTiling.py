@@ -19,36 +19,129 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import hashlib
+import inkex
+import json
+import mmap
+import multiprocessing
+import os
 import simplestyle
+import sys
+from array import array
+import simpletransform
 import math
+import PathChaining
 import SvgBasics
 
+try:
+    import numpy
+except ImportError:
+    # the pure Python implementation is used
+    numpy = None
+
+# Points of the tiling are represented exactly by integer coefficients (a0, a1, a2, a3) of the powers of
+# OMEGA = exp(i * pi / 5), a primitive 10th root of unity. The position of a point is
+#     center + radius * exp(-i * pi / 10) * (a0 + a1 * OMEGA + a2 * OMEGA^2 + a3 * OMEGA^3),
+# so the corners of the initial wheel are the powers of OMEGA. Higher powers are reduced with
+# OMEGA^4 = OMEGA^3 - OMEGA^2 + OMEGA - 1. As 1 / goldenRatio = OMEGA^2 - OMEGA^3, subdividing the triangles only
+# needs integer arithmetic and equal points always have equal coefficients.
+
+def _multiplyByOmega(coefficients):
+    a0, a1, a2, a3 = coefficients
+    return (-a3, a0 + a3, a1 - a3, a2 + a3)
+
+
+def _conjugate(coefficients):
+    # OMEGA^k becomes OMEGA^(10 - k)
+    a0, a1, a2, a3 = coefficients
+    return (a0 + a1, -a1, a1 - a3, -a1 - a2)
+
+
+def _mirror(coefficients):
+    # complex conjugate, then multiplied by OMEGA^2
+    return _multiplyByOmega(_multiplyByOmega(_conjugate(coefficients)))
+
+
+def _multiply(coefficients, otherCoefficients):
+    product = [0] * 7
+    for i, a in enumerate(coefficients):
+        for j, b in enumerate(otherCoefficients):
+            product[i + j] += a * b
+    # OMEGA^4 = OMEGA^3 - OMEGA^2 + OMEGA - 1, OMEGA^5 = -1, OMEGA^6 = -OMEGA
+    c0, c1, c2, c3, c4, c5, c6 = product
+    return (c0 - c4 - c5, c1 + c4 - c6, c2 - c4, c3 + c4)
+
+
+def _isReal(coefficients):
+    # the real numbers are the ones equal to their complex conjugate
+    a0, a1, a2, a3 = coefficients
+    return a1 == 0 and a2 + a3 == 0
+
+
+def isOnLine(point, lineStart, lineEnd):
+    """
+    Returns True, if the point lies on the line through lineStart and lineEnd. The test is exact: (point - lineStart)
+    is a real multiple of (lineEnd - lineStart), if conjugate(lineEnd - lineStart) * (point - lineStart) is real.
+    """
+    direction = (lineEnd - lineStart).coefficients
+    return _isReal(_multiply(_conjugate(direction), (point - lineStart).coefficients))
+
 
 class Point(object):
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    """A point of the tiling, see above. Points are compared and hashed by their coefficients."""
+    __slots__ = ('coefficients',)
+
+    def __init__(self, coefficients):
+        self.coefficients = coefficients
+
+    @staticmethod
+    def fromWheel(index):
+        """Returns OMEGA^index, i.e. the corner of the initial wheel with the given index."""
+        coefficients = (1, 0, 0, 0)
+        for i in xrange(index):
+            coefficients = _multiplyByOmega(coefficients)
+        return Point(coefficients)
 
     # overload only relevant ops
     def __add__(self, other):
-        return Point(self.x + other.x, self.y + other.y)
+        a, b = self.coefficients, other.coefficients
+        return Point((a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3]))
 
     def __sub__(self, other):
-        return Point(self.x - other.x, self.y - other.y)
+        a, b = self.coefficients, other.coefficients
+        return Point((a[0] - b[0], a[1] - b[1], a[2] - b[2], a[3] - b[3]))
+
+    def rotate(self, steps):
+        """Returns the point rotated around the center by steps * 36 degrees."""
+        coefficients = self.coefficients
+        for i in xrange(steps % 10):
+            coefficients = _multiplyByOmega(coefficients)
+        return Point(coefficients)
 
-    def __div__(self, other):
-        return Point(self.x / other, self.y / other)
+    def mirror(self):
+        """
+        Returns the point mirrored at the line through the center and OMEGA, which maps the first triangle of the
+        wheel onto the second one.
+        """
+        return Point(_mirror(self.coefficients))
+
+    def divideByGoldenRatio(self):
+        # multiply by OMEGA^2 - OMEGA^3
+        omega2 = _multiplyByOmega(_multiplyByOmega(self.coefficients))
+        omega3 = _multiplyByOmega(omega2)
+        return Point((omega2[0] - omega3[0], omega2[1] - omega3[1], omega2[2] - omega3[2], omega2[3] - omega3[3]))
 
     def __str__(self):
-        return SvgBasics.formatCoordinates(self.x, self.y)
+        return str(self.coefficients)
 
-    # done to avoid most floating point problems
     def __eq__(self, other):
-        return str(self) == str(other)
+        return self.coefficients == other.coefficients
+
+    def __ne__(self, other):
+        return self.coefficients != other.coefficients
 
     def __hash__(self):
-        hash = self.__str__().__hash__()
-        return hash
+        return hash(self.coefficients)
 
 
 class PenroseTriangle(object):
@@ -59,72 +152,859 @@ class PenroseTriangle(object):
         self.pointC = pointC
 
 
-class PenroseTiling(SvgBasics.BaseEffectExtension):
-    __goldenRatio = (1 + math.sqrt(5)) / 2
+class PenroseTriangleArrays(object):
+    """
+    The triangles of a tiling as structure of arrays, so they can be subdivided with whole-array operations of
+    NumPy. isRed is a boolean array, pointsA, pointsB and pointsC are integer arrays of shape (n, 4) with the
+    coefficients of the points (see Point). The triangles are kept in the same order as by PenroseTiling.subdivide.
+    """
+    def __init__(self, isRed, pointsA, pointsB, pointsC):
+        self.isRed = isRed
+        self.pointsA = pointsA
+        self.pointsB = pointsB
+        self.pointsC = pointsC
+
+    @staticmethod
+    def fromTriangles(triangles):
+        return PenroseTriangleArrays(numpy.array([triangle.isRed for triangle in triangles], dtype=bool),
+                                     numpy.array([t.pointA.coefficients for t in triangles], dtype=numpy.int64),
+                                     numpy.array([t.pointB.coefficients for t in triangles], dtype=numpy.int64),
+                                     numpy.array([t.pointC.coefficients for t in triangles], dtype=numpy.int64))
+
+    def toTriangles(self):
+        return [PenroseTriangle(bool(isRed), Point(tuple(a)), Point(tuple(b)), Point(tuple(c))) for isRed, a, b, c
+                in zip(self.isRed, self.pointsA.tolist(), self.pointsB.tolist(), self.pointsC.tolist())]
+
+    def __len__(self):
+        return len(self.isRed)
+
+    def subdivide(self):
+        red = self.isRed
+        blue = ~red
+        # red triangles are divided into two, blue ones into three triangles, which are stored at the position of
+        # their parent
+        childCounts = numpy.where(red, 2, 3)
+        offsets = numpy.cumsum(childCounts) - childCounts
+        count = int(childCounts.sum())
+        result = PenroseTriangleArrays(numpy.empty(count, dtype=bool), numpy.empty((count, 4), dtype=numpy.int64),
+                                       numpy.empty((count, 4), dtype=numpy.int64),
+                                       numpy.empty((count, 4), dtype=numpy.int64))
+
+        redOffsets = offsets[red]
+        a, b, c = self.pointsA[red], self.pointsB[red], self.pointsC[red]
+        p = a + divideByGoldenRatio(b - a)
+        result._set(redOffsets, True, c, p, b)
+        result._set(redOffsets + 1, False, p, c, a)
+
+        blueOffsets = offsets[blue]
+        a, b, c = self.pointsA[blue], self.pointsB[blue], self.pointsC[blue]
+        q = b + divideByGoldenRatio(a - b)
+        r = b + divideByGoldenRatio(c - b)
+        result._set(blueOffsets, False, r, c, a)
+        result._set(blueOffsets + 1, False, q, r, b)
+        result._set(blueOffsets + 2, True, r, q, a)
+        return result
+
+    def select(self, mask):
+        """Returns the triangles for which mask is True."""
+        return PenroseTriangleArrays(self.isRed[mask], self.pointsA[mask], self.pointsB[mask], self.pointsC[mask])
+
+    def _set(self, indices, isRed, pointsA, pointsB, pointsC):
+        self.isRed[indices] = isRed
+        self.pointsA[indices] = pointsA
+        self.pointsB[indices] = pointsB
+        self.pointsC[indices] = pointsC
+
+    def getEdges(self):
+        """
+        Returns the start and end points of the edges drawn for the triangles (AB and CA of every triangle, in the
+        order of the triangles) as two arrays of shape (2n, 4).
+        """
+        count = len(self)
+        starts = numpy.empty((2 * count, 4), dtype=numpy.int64)
+        ends = numpy.empty((2 * count, 4), dtype=numpy.int64)
+        starts[0::2] = self.pointsA
+        ends[0::2] = self.pointsB
+        starts[1::2] = self.pointsC
+        ends[1::2] = self.pointsA
+        return starts, ends
+
+
+def multiplyByOmega(points):
+    """The vectorized version of _multiplyByOmega for an array of shape (n, 4)."""
+    result = numpy.empty_like(points)
+    result[:, 0] = -points[:, 3]
+    result[:, 1] = points[:, 0] + points[:, 3]
+    result[:, 2] = points[:, 1] - points[:, 3]
+    result[:, 3] = points[:, 2] + points[:, 3]
+    return result
+
+
+def mirror(points):
+    """The vectorized version of Point.mirror for an array of shape (n, 4)."""
+    conjugates = numpy.empty_like(points)
+    conjugates[:, 0] = points[:, 0] + points[:, 1]
+    conjugates[:, 1] = -points[:, 1]
+    conjugates[:, 2] = points[:, 1] - points[:, 3]
+    conjugates[:, 3] = -points[:, 1] - points[:, 2]
+    return multiplyByOmega(multiplyByOmega(conjugates))
+
+
+def transformToSector(points, sector):
+    """
+    Maps points of the first triangle of the wheel (and its subdivisions) onto the triangle with the given index.
+    The triangles with odd index are mirror images of the first one, all are rotated by multiples of 72 degrees.
+    """
+    if sector % 2 == 1:
+        points = mirror(points)
+    for i in xrange(sector - sector % 2):
+        points = multiplyByOmega(points)
+    return points
+
+
+def isOnSectorBorder(points):
+    """
+    Returns a boolean array, which is True for the points on the line through the center and 1 and for the points on
+    the line through the center and OMEGA, i.e. the sides the first triangle of the wheel shares with its neighbours.
+    """
+    # the points on the first line are real, the ones on the second line are not changed by mirroring
+    isReal = (points[:, 1] == 0) & (points[:, 2] + points[:, 3] == 0)
+    return isReal, numpy.all(mirror(points) == points, axis=1)
+
+
+def divideByGoldenRatio(points):
+    """The vectorized version of Point.divideByGoldenRatio for an array of shape (n, 4)."""
+    omega2 = multiplyByOmega(multiplyByOmega(points))
+    return omega2 - multiplyByOmega(omega2)
+
+
+# the coefficients are packed into a single integer with this number of bits per coefficient
+_KEY_BITS = 16
+
+
+def getPointKeys(points):
+    """
+    Packs the coefficients of each point into a single unsigned integer, so points can be compared exactly with one
+    integer comparison.
+    """
+    offset = 1 << (_KEY_BITS - 1)
+    if len(points) and (points.min() < -offset or points.max() >= offset):
+        raise Exception('The coefficients of the points are too big for the keys of the edges')
+    shifted = (points + offset).astype(numpy.uint64)
+    keys = shifted[:, 0]
+    for column in xrange(1, 4):
+        keys = (keys << numpy.uint64(_KEY_BITS)) | shifted[:, column]
+    return keys
+
+
+def getFirstOccurrences(starts, ends):
+    """Returns the sorted indices of the first occurrence of every edge, regardless of its direction."""
+    startKeys = getPointKeys(starts)
+    endKeys = getPointKeys(ends)
+    # normalize the direction of the edges, so the first point is the smaller one
+    lowKeys = numpy.minimum(startKeys, endKeys)
+    highKeys = numpy.maximum(startKeys, endKeys)
+    # the sort is stable, so the first occurrence of equal keys comes first
+    order = numpy.lexsort((highKeys, lowKeys))
+    isFirst = numpy.ones(len(order), dtype=bool)
+    isFirst[1:] = (lowKeys[order[1:]] != lowKeys[order[:-1]]) | (highKeys[order[1:]] != highKeys[order[:-1]])
+    return numpy.sort(order[isFirst])
+
+
+# The edges and triangles are converted into rows of integers for the cache and the worker processes: the
+# coefficients of start and end point of an edge or the color and the coefficients of the three points of a triangle.
+# The rows are an int array of shape (n, columns) for NumPy and a flat sequence of ints otherwise.
+EDGE_COLUMNS = 8
+TRIANGLE_COLUMNS = 13
+
+
+def edgesToRows(edges, useNumpy):
+    if useNumpy:
+        return numpy.hstack(edges)
+    rows = []
+    for startPoint, endPoint in edges:
+        rows.extend(startPoint.coefficients)
+        rows.extend(endPoint.coefficients)
+    return rows
+
+
+def edgesFromRows(rows, useNumpy):
+    if useNumpy:
+        rows = rows.astype(numpy.int64)
+        return rows[:, :4].copy(), rows[:, 4:].copy()
+    return [(Point(tuple(rows[i:i + 4])), Point(tuple(rows[i + 4:i + 8]))) for i in xrange(0, len(rows), 8)]
+
+
+def trianglesToRows(triangles, useNumpy):
+    if useNumpy:
+        return numpy.hstack((triangles.isRed[:, numpy.newaxis], triangles.pointsA, triangles.pointsB,
+                             triangles.pointsC))
+    rows = []
+    for triangle in triangles:
+        rows.append(int(triangle.isRed))
+        rows.extend(triangle.pointA.coefficients)
+        rows.extend(triangle.pointB.coefficients)
+        rows.extend(triangle.pointC.coefficients)
+    return rows
+
+
+def trianglesFromRows(rows, useNumpy):
+    if useNumpy:
+        rows = rows.astype(numpy.int64)
+        return PenroseTriangleArrays(rows[:, 0] != 0, rows[:, 1:5].copy(), rows[:, 5:9].copy(), rows[:, 9:13].copy())
+    return [PenroseTriangle(rows[i] != 0, Point(tuple(rows[i + 1:i + 5])), Point(tuple(rows[i + 5:i + 9])),
+                            Point(tuple(rows[i + 9:i + 13]))) for i in xrange(0, len(rows), 13)]
+
+
+def subdivideTriangles(triangles):
+    result = []
+    for triangle in triangles:
+        if triangle.isRed:
+            # Subdivide red triangle
+            P = triangle.pointA + (triangle.pointB - triangle.pointA).divideByGoldenRatio()
+            result += [PenroseTriangle(True, triangle.pointC, P, triangle.pointB),
+                       PenroseTriangle(False, P, triangle.pointC, triangle.pointA)]
+        else:
+            # Subdivide blue triangle
+            Q = triangle.pointB + (triangle.pointA - triangle.pointB).divideByGoldenRatio()
+            R = triangle.pointB + (triangle.pointC - triangle.pointB).divideByGoldenRatio()
+            result += [PenroseTriangle(False, R, triangle.pointC, triangle.pointA),
+                       PenroseTriangle(False, Q, R, triangle.pointB),
+                       PenroseTriangle(True, R, Q, triangle.pointA)]
+    return result
+
+
+def removeDuplicateEdges(edges):
+    """Returns the first occurrence of every edge (startPoint, endPoint), regardless of its direction."""
+    drawnLines = set()
+    result = []
+    for startPoint, endPoint in edges:
+        startKey = startPoint.coefficients
+        endKey = endPoint.coefficients
+        normed = (startKey, endKey) if startKey < endKey else (endKey, startKey)
+        if normed not in drawnLines:
+            drawnLines.add(normed)
+            result.append((startPoint, endPoint))
+    return result
+
+
+def _generateTriangleEdges(triangles):
+    for triangle in triangles:
+        yield (triangle.pointA, triangle.pointB)
+        yield (triangle.pointC, triangle.pointA)
+
+
+def getDistinctEdges(triangles):
+    """Returns the edges drawn for the triangles (AB and CA) as list of (startPoint, endPoint), without repetitions."""
+    return removeDuplicateEdges(_generateTriangleEdges(triangles))
 
+
+# the triangles are split into this many chunks per worker process, so the workers finish at about the same time
+PARALLEL_CHUNKS_PER_WORKER = 4
+
+
+def toShortRows(rows, useNumpy):
+    """Returns the rows as 16 bit integers, which are cheap to transfer, or None if a value exceeds 16 bits."""
+    if useNumpy:
+        if len(rows) and (rows.min() < -32768 or rows.max() > 32767):
+            return None
+        return rows.astype(numpy.int16)
+    try:
+        return array('h', rows)
+    except OverflowError:
+        return None
+
+
+def subdivideInWorker(task):
+    """
+    Subdivides the triangles of a task of PenroseTiling._createEdgesInParallel in a worker process. Returns the
+    distinct edges and, if returnTriangles is set, the subdivided triangles as 16 bit rows (see toShortRows).
+    """
+    useNumpy, levels, triangleRows, returnTriangles = task
+    triangles = trianglesFromRows(triangleRows, useNumpy)
+    for level in xrange(levels):
+        triangles = triangles.subdivide() if useNumpy else subdivideTriangles(triangles)
+    if useNumpy:
+        starts, ends = triangles.getEdges()
+        unique = getFirstOccurrences(starts, ends)
+        edgeRows = edgesToRows((starts[unique], ends[unique]), True).astype(numpy.int16)
+    else:
+        edgeRows = array('h', edgesToRows(getDistinctEdges(triangles), False))
+    return edgeRows, toShortRows(trianglesToRows(triangles, useNumpy), useNumpy) if returnTriangles else None
+
+
+# the triangles of the deepest level computed by this process with --keepSession, (level, sector only) -> triangles
+_sessionTriangles = {}
+
+
+class TilingCache(object):
+    """
+    A disk cache of the distinct edges and of the triangles of tilings. The points are stored with their coefficients
+    (see Point), so they do not depend on radius and position. A file consists of a header with the key and rows of
+    little-endian 16 bit integers: the coefficients of start and end point of every edge or the color and the
+    coefficients of the three points of every triangle. The files are memory-mapped when they are loaded. If the files
+    take more than maxBytes, the least recently used ones are deleted.
+    """
+    MAGIC = b'PENROSE-CACHE 1\n'
+
+    def __init__(self, directory, maxBytes):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+    def _getFileAndHeader(self, key):
+        keyText = json.dumps(key, sort_keys=True)
+        fileName = 'tiling-' + hashlib.md5(keyText.encode('utf-8')).hexdigest()[:16] + '.cache'
+        return os.path.join(self.directory, fileName), TilingCache.MAGIC + keyText.encode('utf-8') + b'\n'
+
+    def _load(self, key, columns, useNumpy):
+        """
+        Returns the rows of the file as int64 array of shape (n, columns) if useNumpy is set, as flat array('h')
+        otherwise, or None if there is no such file.
+        """
+        cacheFile, header = self._getFileAndHeader(key)
+        rowBytes = 2 * columns
+        try:
+            with open(cacheFile, 'rb') as stream:
+                if stream.read(len(header)) != header:
+                    return None
+                count = (os.fstat(stream.fileno()).st_size - len(header)) // rowBytes
+                if count == 0:
+                    return None
+                if useNumpy:
+                    mapped = numpy.memmap(stream, dtype='<i2', mode='r', offset=len(header), shape=(count, columns))
+                    rows = mapped.astype(numpy.int64)
+                    del mapped
+                else:
+                    mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        rows = array('h')
+                        rows.fromstring(mapped[len(header):len(header) + count * rowBytes])
+                    finally:
+                        mapped.close()
+                    if sys.byteorder == 'big':
+                        rows.byteswap()
+            # the modification time marks the last use for the eviction
+            os.utime(cacheFile, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return rows
+
+    def _store(self, key, rows, useNumpy):
+        """Stores an int array of shape (n, columns) or a flat list of ints. Values exceeding 16 bits are not cached."""
+        if useNumpy:
+            if len(rows) and (rows.min() < -32768 or rows.max() > 32767):
+                return
+            data = rows.astype('<i2').tobytes()
+        else:
+            try:
+                rows = array('h', rows)
+            except OverflowError:
+                return
+            if sys.byteorder == 'big':
+                rows.byteswap()
+            data = rows.tostring()
+        cacheFile, header = self._getFileAndHeader(key)
+        if len(header) + len(data) > self.maxBytes:
+            return
+        if SvgBasics.writeCacheFile(cacheFile, header + data):
+            self._evict(cacheFile)
+
+    def loadEdges(self, key, useNumpy):
+        """
+        Returns the cached edges as (starts, ends) arrays if useNumpy is set, as list of (startPoint, endPoint)
+        otherwise, or None if they are not cached.
+        """
+        rows = self._load(dict(key, kind='edges'), EDGE_COLUMNS, useNumpy)
+        return None if rows is None else edgesFromRows(rows, useNumpy)
+
+    def storeEdges(self, key, edges, useNumpy):
+        """Stores the edges as returned by loadEdges."""
+        self._store(dict(key, kind='edges'), edgesToRows(edges, useNumpy), useNumpy)
+
+    def loadTriangles(self, key, useNumpy):
+        """Returns the cached triangles as PenroseTriangleArrays if useNumpy is set, as list otherwise, or None."""
+        rows = self._load(dict(key, kind='triangles'), TRIANGLE_COLUMNS, useNumpy)
+        return None if rows is None else trianglesFromRows(rows, useNumpy)
+
+    def storeTriangles(self, key, triangles, useNumpy):
+        """Stores the triangles as returned by loadTriangles."""
+        self.storeTriangleRows(key, trianglesToRows(triangles, useNumpy), useNumpy)
+
+    def storeTriangleRows(self, key, rows, useNumpy):
+        """Stores triangles given as rows, see trianglesToRows."""
+        self._store(dict(key, kind='triangles'), rows, useNumpy)
+
+    def _evict(self, keptFile):
+        files = []
+        for fileName in os.listdir(self.directory):
+            if fileName.endswith('.cache'):
+                cacheFile = os.path.join(self.directory, fileName)
+                try:
+                    fileStat = os.stat(cacheFile)
+                except OSError:
+                    continue
+                files.append((fileStat.st_mtime, fileStat.st_size, cacheFile))
+        totalBytes = sum(size for modificationTime, size, cacheFile in files)
+        for modificationTime, size, cacheFile in sorted(files):
+            if totalBytes <= self.maxBytes:
+                break
+            if cacheFile == keptFile:
+                continue
+            try:
+                os.remove(cacheFile)
+                totalBytes -= size
+            except OSError:
+                pass
+
+
+class PenroseTiling(SvgBasics.BaseEffectExtension):
     def __init__(self):
         SvgBasics.BaseEffectExtension.__init__(self, 'PenroseTiling.inx')
+        self.OptionParser.add_option('--keepSession', action='store', type='inkbool', dest='keepSession',
+                                     default=False,
+                                     help='Keep the triangles of the deepest level in memory for the next run in the '
+                                          'same process, e.g. in the workers of BatchRunner')
+        # the position of the points with the coefficients (1, 0, 0, 0), (0, 1, 0, 0) etc., see Point
+        self._basisX = None
+        self._basisY = None
+        self._centerX = None
+        self._centerY = None
+        # (left, top, right, bottom) of the region the tiling is generated for or None for the whole disc
+        self._clipRegion = None
 
     def subdivide(self, triangles):
+        return subdivideTriangles(triangles)
+
+    def _toCoordinates(self, point):
+        a0, a1, a2, a3 = point.coefficients
+        basisX, basisY = self._basisX, self._basisY
+        return (self._centerX + a0 * basisX[0] + a1 * basisX[1] + a2 * basisX[2] + a3 * basisX[3],
+                self._centerY + a0 * basisY[0] + a1 * basisY[1] + a2 * basisY[2] + a3 * basisY[3])
+
+    def _toCoordinateArray(self, points):
+        """The vectorized version of _toCoordinates, returns an array of shape (n, 2)."""
+        basis = numpy.array([self._basisX, self._basisY]).T
+        return numpy.dot(points.astype(float), basis) + numpy.array([self._centerX, self._centerY])
+
+    def _getClipRegion(self):
+        clipRegion = self.options.clipRegion
+        if clipRegion == 'rectangle':
+            left = self._conv(self.options.clipLeft)
+            top = self._conv(self.options.clipTop)
+            return (left, top, left + self._conv(self.options.clipWidth), top + self._conv(self.options.clipHeight))
+        if clipRegion == 'selection':
+            boundingBox = simpletransform.computeBBox(self.selected.values())
+            if boundingBox is None:
+                inkex.errormsg('Nothing is selected, the whole tiling is generated.')
+                return None
+            xMin, xMax, yMin, yMax = boundingBox
+            return (xMin, yMin, xMax, yMax)
+        return None
+
+    def _cullTriangles(self, triangles):
+        """
+        Removes the triangles whose bounding box lies completely outside of the clip region. As the children of a
+        triangle lie within their parent, none of the removed triangles contributes to the tiling inside the region.
+        """
+        left, top, right, bottom = self._clipRegion
         result = []
         for triangle in triangles:
-            if triangle.isRed:
-                # Subdivide red triangle
-                P = triangle.pointA + (triangle.pointB - triangle.pointA) / PenroseTiling.__goldenRatio
-                result += [PenroseTriangle(True, triangle.pointC, P, triangle.pointB),
-                           PenroseTriangle(False, P, triangle.pointC, triangle.pointA)]
-            else:
-                # Subdivide blue triangle
-                Q = triangle.pointB + (triangle.pointA - triangle.pointB) / PenroseTiling.__goldenRatio
-                R = triangle.pointB + (triangle.pointC - triangle.pointB) / PenroseTiling.__goldenRatio
-                result += [PenroseTriangle(False, R, triangle.pointC, triangle.pointA),
-                           PenroseTriangle(False, Q, R, triangle.pointB),
-                           PenroseTriangle(True, R, Q, triangle.pointA)]
+            aX, aY = self._toCoordinates(triangle.pointA)
+            bX, bY = self._toCoordinates(triangle.pointB)
+            cX, cY = self._toCoordinates(triangle.pointC)
+            if min(aX, bX, cX) <= right and max(aX, bX, cX) >= left and \
+                    min(aY, bY, cY) <= bottom and max(aY, bY, cY) >= top:
+                result.append(triangle)
         return result
 
+    def _cullTriangleArrays(self, triangles):
+        """The vectorized version of _cullTriangles."""
+        left, top, right, bottom = self._clipRegion
+        pointsA = self._toCoordinateArray(triangles.pointsA)
+        pointsB = self._toCoordinateArray(triangles.pointsB)
+        pointsC = self._toCoordinateArray(triangles.pointsC)
+        minima = numpy.minimum(numpy.minimum(pointsA, pointsB), pointsC)
+        maxima = numpy.maximum(numpy.maximum(pointsA, pointsB), pointsC)
+        return triangles.select((minima[:, 0] <= right) & (maxima[:, 0] >= left) &
+                                (minima[:, 1] <= bottom) & (maxima[:, 1] >= top))
 
-    def _drawLine(self, startPoint, endPoint, style, lineArr=None):
-        sP = str(startPoint)
-        eP = str(endPoint)
-        normed = ' '.join(sorted([sP, eP]))
-        if normed not in self.drawnLines:
-            edge = 'M' + sP + ' L' + eP
-            self.drawnLines.add(normed)
-            if lineArr is None:
-                self._addPathToDocumentTree(style, edge)
-            else:
-                lineArr.append(edge)
+    def _generateEdgePaths(self, segments, style):
+        for startX, startY, endX, endY in segments:
+            yield (style, SvgBasics.PathBuilder().moveAbs(startX, startY).lineAbs(endX, endY))
 
-    def effect(self):
-        self.radius = self._conv(self.options.radius)
-        self.linewidth = self._conv(self.options.linewidth)
+    def _addChainedEdges(self, style, segments, keys):
+        """Joins the distinct edges into polylines ordered for short travel and adds them as one path."""
+        with self.span('chain'):
+            polylines = PathChaining.chainSegments(segments, keys)
+        path = SvgBasics.PathBuilder()
+        for polyline in polylines:
+            path.moveAbs(*polyline[0])
+            for x, y in polyline[1:]:
+                path.lineAbs(x, y)
+        travelBefore = PathChaining.getSegmentTravelDistance(segments)
+        travelAfter = PathChaining.getTravelDistance(polylines)
+        self._profiler.count('segments', len(segments))
+        self._profiler.count('polylines', len(polylines))
+        self._profiler.count('travel before', round(travelBefore, 3))
+        self._profiler.count('travel after', round(travelAfter, 3))
+        self.trace(SvgBasics.TRACE_INFO, '%d segments chained into %d polylines, travel distance %.3f before, %.3f '
+                   'after', len(segments), len(polylines), travelBefore, travelAfter)
+        self._addPathToDocumentTree(style, path)
+
+    def _drawEdges(self, edges, style):
+        """Draws the edges, which may be generated while they are drawn (see _generateDepthFirstEdges)."""
+        if self.options.combineLines and self.options.chainEdges:
+            # all edges are needed for joining them
+            edges = list(edges)
+        segments = (self._toCoordinates(startPoint) + self._toCoordinates(endPoint) for startPoint, endPoint in edges)
+        if self.options.combineLines and self.options.chainEdges:
+            keys = [(startPoint.coefficients, endPoint.coefficients) for startPoint, endPoint in edges]
+            self._addChainedEdges(style, list(segments), keys)
+        elif self.options.combineLines:
+            path = SvgBasics.PathBuilder()
+            for startX, startY, endX, endY in segments:
+                path.moveAbs(startX, startY).lineAbs(endX, endY)
+            self._addPathToDocumentTree(style, path)
+        else:
+            self._addPathsToDocumentTree(self._generateEdgePaths(segments, style), 'Penrose tiling')
 
+    def _drawEdgeArrays(self, starts, ends, style):
+        segments = numpy.hstack((self._toCoordinateArray(starts), self._toCoordinateArray(ends)))
+        if self.options.combineLines and self.options.chainEdges:
+            keys = zip(getPointKeys(starts).tolist(), getPointKeys(ends).tolist())
+            self._addChainedEdges(style, segments.tolist(), keys)
+        elif self.options.combineLines:
+            self._addPathToDocumentTree(style, SvgBasics.PathBuilder().addLineSegments(segments.ravel().tolist()))
+        else:
+            self._addPathsToDocumentTree(self._generateEdgePaths(segments.tolist(), style), 'Penrose tiling')
+
+    def _getTilingCache(self):
+        if self.options.cacheSize <= 0:
+            return None
+        return TilingCache(os.path.join(SvgBasics.getCacheDir(), 'penrose'), self.options.cacheSize * 1024 * 1024)
+
+    def _createWheel(self):
         # Create wheel of triangles around the origin
         triangles = []
-        A = Point(self.radius, self.radius)
+        A = Point((0, 0, 0, 0))
         for i in xrange(10):
-            phi = (2 * i - 1) * math.pi / 10
-            B = Point(self.radius * math.cos(phi), self.radius * math.sin(phi)) + A
-            phi = (2 * i + 1) * math.pi / 10
-            C = Point(self.radius * math.cos(phi), self.radius * math.sin(phi)) + A
+            B = Point.fromWheel(i)
+            C = Point.fromWheel(i + 1)
             triangle = PenroseTriangle(True, A, C, B) if i % 2 == 0 else PenroseTriangle(True, A, B, C)
             triangles.append(triangle)
+        return triangles
+
+    def _getLevelKey(self, level, sectorOnly):
+        if sectorOnly:
+            return {'recursions': level, 'sector': 0}
+        return {'recursions': level}
+
+    def _loadDeepestLevel(self, useNumpy, cache, sectorOnly, recursions):
+        """
+        Returns (level, triangles) of the deepest level up to recursions, that has been computed before in this
+        process or is in the cache, or the wheel (level 0). With sectorOnly, only the first triangle of the wheel and
+        its subdivisions are used.
+        """
+        for level in xrange(recursions, 0, -1):
+            triangles = _sessionTriangles.get((level, sectorOnly))
+            if triangles is not None:
+                if useNumpy != isinstance(triangles, PenroseTriangleArrays):
+                    triangles = PenroseTriangleArrays.fromTriangles(triangles) if useNumpy else triangles.toTriangles()
+                return level, triangles
+            if cache is not None:
+                triangles = cache.loadTriangles(self._getLevelKey(level, sectorOnly), useNumpy)
+                if triangles is not None:
+                    return level, triangles
+        triangles = self._createWheel()
+        if sectorOnly:
+            triangles = triangles[:1]
+        return 0, PenroseTriangleArrays.fromTriangles(triangles) if useNumpy else triangles
+
+    def _createTriangles(self, useNumpy, cache, sectorOnly=False, recursions=None):
+        """
+        Returns the triangles after the requested number of recursions (or the given number of recursions). The
+        subdivision starts at the deepest level computed before. Only the last level is stored in the cache, the levels
+        below it are cheap to compute again.
+        """
+        isDeepestLevel = recursions is None
+        if isDeepestLevel:
+            recursions = self.options.recursions
+        with self.span('cache'):
+            level, triangles = self._loadDeepestLevel(useNumpy, cache, sectorOnly, recursions)
+        self._profiler.count('reused level', level)
+        isComputed = level < recursions
+
+        # Perform subdivisions, triangles outside of the clip region are dropped on every level
+        with self.span('subdivide'):
+            for level in xrange(level + 1, recursions + 1):
+                if self._clipRegion is not None:
+                    triangles = self._cullTriangleArrays(triangles) if useNumpy else self._cullTriangles(triangles)
+                triangles = triangles.subdivide() if useNumpy else self.subdivide(triangles)
+            if self._clipRegion is None and cache is not None and isComputed:
+                with self.span('cache'):
+                    cache.storeTriangles(self._getLevelKey(recursions, sectorOnly), triangles, useNumpy)
+            if self._clipRegion is not None:
+                triangles = self._cullTriangleArrays(triangles) if useNumpy else self._cullTriangles(triangles)
+            self._profiler.count('triangles', len(triangles))
+
+        if self._clipRegion is None and isDeepestLevel:
+            # a single run never reuses the triangles, so they are only kept in memory on request
+            _sessionTriangles.clear()
+            if self.options.keepSession:
+                _sessionTriangles[(recursions, sectorOnly)] = triangles
+        return triangles
+
+    def _createEdges(self, useNumpy, cache, sectorOnly=False):
+        """Returns the distinct edges of the tiling, see getDistinctEdges and getFirstOccurrences."""
+        if self.options.workers > 1 and self._clipRegion is None:
+            return self._createEdgesInParallel(useNumpy, cache, sectorOnly)
+        triangles = self._createTriangles(useNumpy, cache, sectorOnly)
+        with self.span('dedup'):
+            if useNumpy:
+                starts, ends = triangles.getEdges()
+                unique = getFirstOccurrences(starts, ends)
+                return starts[unique], ends[unique]
+            return getDistinctEdges(triangles)
+
+    def _createEdgesInParallel(self, useNumpy, cache, sectorOnly):
+        """
+        Subdivides the triangles of a low level until there are enough of them to keep the workers busy, then
+        distributes consecutive chunks of them over the worker processes. Each worker subdivides its chunk down to
+        the requested level and returns the distinct edges; the edges shared by the chunks are removed here. As the
+        chunks keep the order of the triangles, the edges are the same as in serial mode. The subdivision starts at
+        the deepest level computed before, if it is deep enough to be split; the workers return the triangles of the
+        requested level, so it can be kept for later runs like in serial mode.
+        """
+        workers = self.options.workers
+        chunkCount = workers * PARALLEL_CHUNKS_PER_WORKER
+        # the number of triangles grows by the factor goldenRatio^2 per level
+        recursions = self.options.recursions
+        splitLevel = 0
+        triangleCount = 1 if sectorOnly else 10
+        while splitLevel < recursions and triangleCount < chunkCount:
+            splitLevel += 1
+            triangleCount *= 2.6
+        with self.span('cache'):
+            level, triangles = self._loadDeepestLevel(useNumpy, cache, sectorOnly, recursions)
+        self._profiler.count('reused level', level)
+        with self.span('subdivide'):
+            while level < splitLevel:
+                triangles = triangles.subdivide() if useNumpy else self.subdivide(triangles)
+                level += 1
+        storeTriangles = level < recursions and (cache is not None or self.options.keepSession)
+
+        rows = trianglesToRows(triangles, useNumpy)
+        if useNumpy:
+            rows = rows.astype(numpy.int16)
+            chunks = numpy.array_split(rows, min(chunkCount, len(rows)))
+        else:
+            rows = array('h', rows)
+            # the bounds of the chunks in triangles
+            bounds = [len(triangles) * index // chunkCount for index in xrange(chunkCount + 1)]
+            chunks = [rows[bounds[index] * TRIANGLE_COLUMNS:bounds[index + 1] * TRIANGLE_COLUMNS]
+                      for index in xrange(chunkCount) if bounds[index] < bounds[index + 1]]
+        tasks = [(useNumpy, recursions - level, chunk, storeTriangles) for chunk in chunks]
+
+        with self.span('workers'):
+            pool = multiprocessing.Pool(min(workers, len(tasks)))
+            try:
+                results = pool.map(subdivideInWorker, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        triangleRows = [chunkTriangles for chunkEdges, chunkTriangles in results]
+        if storeTriangles and all(chunkTriangles is not None for chunkTriangles in triangleRows):
+            # the chunks are in the order of the triangles, so they are the same as in serial mode
+            if useNumpy:
+                triangleRows = numpy.vstack(triangleRows)
+            else:
+                chunkRows = triangleRows
+                triangleRows = array('h')
+                for chunkTriangles in chunkRows:
+                    triangleRows.extend(chunkTriangles)
+            if cache is not None:
+                with self.span('cache'):
+                    cache.storeTriangleRows(self._getLevelKey(recursions, sectorOnly), triangleRows, useNumpy)
+            _sessionTriangles.clear()
+            if self.options.keepSession:
+                _sessionTriangles[(recursions, sectorOnly)] = trianglesFromRows(triangleRows, useNumpy)
+
+        with self.span('merge'):
+            if useNumpy:
+                starts, ends = edgesFromRows(numpy.vstack([chunkEdges for chunkEdges, chunkTriangles in results]),
+                                             True)
+                unique = getFirstOccurrences(starts, ends)
+                return starts[unique], ends[unique]
+            edges = []
+            for chunkEdges, chunkTriangles in results:
+                edges.extend(edgesFromRows(chunkEdges, False))
+            return removeDuplicateEdges(edges)
+
+    def _createSymmetricEdges(self, useNumpy, cache):
+        """
+        Returns the same edges as _createEdges, but only subdivides the first triangle of the wheel. The subdivisions
+        of the other triangles are rotated and mirrored copies, so the edges of the first triangle are mapped onto
+        them. Only the edges on the sides shared by neighbouring triangles can occur twice.
+        """
+        edges = self._createEdges(useNumpy, cache, sectorOnly=True)
+        with self.span('dedup'):
+            if useNumpy:
+                starts, ends = edges
+                startsOnFirst, startsOnSecond = isOnSectorBorder(starts)
+                endsOnFirst, endsOnSecond = isOnSectorBorder(ends)
+                borderIndices = numpy.nonzero((startsOnFirst & endsOnFirst) | (startsOnSecond & endsOnSecond))[0]
+            else:
+                borderIndices = [index for index, (startPoint, endPoint) in enumerate(edges)
+                                 if self._isOnSectorBorder(startPoint, endPoint)]
 
-        # Perform subdivisions
-        for i in xrange(self.options.recursions):
-            triangles = self.subdivide(triangles)
+        with self.span('symmetry'):
+            drawnBorders = set()
+            sectorEdges = []
+            for sector in xrange(10):
+                if useNumpy:
+                    sectorStarts = transformToSector(starts, sector)
+                    sectorEnds = transformToSector(ends, sector)
+                    borderEdges = zip(getPointKeys(sectorStarts[borderIndices]).tolist(),
+                                      getPointKeys(sectorEnds[borderIndices]).tolist())
+                else:
+                    # the points are shared by several edges, so every point is transformed once
+                    transformed = {}
+                    for startPoint, endPoint in edges:
+                        for point in (startPoint, endPoint):
+                            if point not in transformed:
+                                transformed[point] = self._transformToSector(point, sector)
+                    sectorStarts = [transformed[startPoint] for startPoint, endPoint in edges]
+                    sectorEnds = [transformed[endPoint] for startPoint, endPoint in edges]
+                    borderEdges = [(sectorStarts[index].coefficients, sectorEnds[index].coefficients)
+                                   for index in borderIndices]
+                # the first occurrence of a border edge is kept, as by getFirstOccurrences
+                isDrawn = set()
+                for index, (startKey, endKey) in zip(borderIndices, borderEdges):
+                    normed = (startKey, endKey) if startKey < endKey else (endKey, startKey)
+                    if normed in drawnBorders:
+                        isDrawn.add(index)
+                    else:
+                        drawnBorders.add(normed)
+                if useNumpy:
+                    keep = numpy.ones(len(sectorStarts), dtype=bool)
+                    keep[list(isDrawn)] = False
+                    sectorEdges.append((sectorStarts[keep], sectorEnds[keep]))
+                else:
+                    sectorEdges.extend((sectorStarts[index], sectorEnds[index]) for index in xrange(len(edges))
+                                       if index not in isDrawn)
+            if useNumpy:
+                return (numpy.vstack([sectorStarts for sectorStarts, sectorEnds in sectorEdges]),
+                        numpy.vstack([sectorEnds for sectorStarts, sectorEnds in sectorEdges]))
+            return sectorEdges
 
-        self.drawnLines = set()
+    def _transformToSector(self, point, sector):
+        """See transformToSector."""
+        if sector % 2 == 1:
+            point = point.mirror()
+        return point.rotate(sector - sector % 2)
+
+    def _isOnSectorBorder(self, startPoint, endPoint):
+        """Returns True for edges on one of the sides the first triangle of the wheel shares, see isOnSectorBorder."""
+        return (_isReal(startPoint.coefficients) and _isReal(endPoint.coefficients)) or \
+            (startPoint.mirror() == startPoint and endPoint.mirror() == endPoint)
+
+    def _isOnTriangleBorder(self, triangle, startPoint, endPoint):
+        """Returns True, if the edge lies on one of the sides of the triangle, see isOnLine."""
+        corners = (triangle.pointA, triangle.pointB, triangle.pointC)
+        for index in xrange(3):
+            lineStart, lineEnd = corners[index], corners[(index + 1) % 3]
+            if isOnLine(startPoint, lineStart, lineEnd) and isOnLine(endPoint, lineStart, lineEnd):
+                return True
+        return False
+
+    def _generateDepthFirstEdges(self):
+        """
+        Walks the subdivision tree depth-first and yields the distinct edges of the leaves, in the same order as the
+        breadth-first subdivision. Only the triangles on the path to the current leaf and their siblings are kept.
+
+        An edge is remembered, as long as another leaf could draw it again. Leaves never overlap, so an edge inside
+        of a triangle can only be drawn by the leaves of this triangle. When all leaves of a triangle are done, its
+        inner edges are forgotten and only the edges on its sides are passed on to its parent. So the remembered edges
+        are the ones on the sides of the triangles on the path, which grow with the square root of the number of
+        leaves.
+        """
+        drawnLines = set()
+        # entries are (triangle, remaining levels, edges added by the parent, edges added by the triangle); the last
+        # is set when the children have been pushed, then the entry is processed again after them
+        stack = [(triangle, self.options.recursions, [], None) for triangle in reversed(self._createWheel())]
+        while stack:
+            triangle, levels, parentEdges, addedEdges = stack.pop()
+            if addedEdges is not None:
+                for entry in addedEdges:
+                    if self._isOnTriangleBorder(triangle, entry[1], entry[2]):
+                        parentEdges.append(entry)
+                    else:
+                        drawnLines.discard(entry[0])
+            elif self._clipRegion is not None and not self._cullTriangles([triangle]):
+                continue
+            elif levels == 0:
+                self._profiler.count('triangles')
+                for startPoint, endPoint in ((triangle.pointA, triangle.pointB), (triangle.pointC, triangle.pointA)):
+                    startKey = startPoint.coefficients
+                    endKey = endPoint.coefficients
+                    normed = (startKey, endKey) if startKey < endKey else (endKey, startKey)
+                    if normed not in drawnLines:
+                        drawnLines.add(normed)
+                        # the edges of a leaf are on its sides
+                        parentEdges.append((normed, startPoint, endPoint))
+                        yield (startPoint, endPoint)
+            else:
+                addedEdges = []
+                stack.append((triangle, levels, parentEdges, addedEdges))
+                for child in reversed(subdivideTriangles([triangle])):
+                    stack.append((child, levels - 1, addedEdges, None))
+        self._profiler.count('remembered edges', len(drawnLines))
+
+    def effect(self):
+        self.radius = self._conv(self.options.radius)
+        self.linewidth = self._conv(self.options.linewidth)
+
+        self._centerX = self.radius
+        self._centerY = self.radius
+        self._basisX = [self.radius * math.cos((2 * k - 1) * math.pi / 10) for k in xrange(4)]
+        self._basisY = [self.radius * math.sin((2 * k - 1) * math.pi / 10) for k in xrange(4)]
+
+        useNumpy = numpy is not None and self.options.useNumpy and not self.options.depthFirst
+        self._clipRegion = self._getClipRegion()
         style = simplestyle.formatStyle(
             {'stroke': '#000000', 'stroke-width': str(self.linewidth), 'fill': 'none', 'stroke-linecap': 'round'})
-        lineArr = [] if self.options.combineLines else None
-        for triangle in triangles:
-            self._drawLine(triangle.pointA, triangle.pointB, style, lineArr)
-            self._drawLine(triangle.pointC, triangle.pointA, style, lineArr)
-        if self.options.combineLines:
-            self._addPathToDocumentTree(style, ' '.join(lineArr))
+
+        if self.options.depthFirst:
+            # the edges are drawn while they are generated
+            self._drawEdges(self._generateDepthFirstEdges(), style)
+            return
+
+        # the edges are independent of radius and position, so they can be reused from the cache. The clipped tiling
+        # depends on the radius, only the triangles of the unclipped levels it starts from are cached.
+        cache = self._getTilingCache()
+        cacheKey = {'recursions': self.options.recursions}
+        edges = None
+        if cache is not None and self._clipRegion is None:
+            with self.span('cache'):
+                edges = cache.loadEdges(cacheKey, useNumpy)
+        if edges is None:
+            # the triangles have to be culled individually for a clip region
+            if self.options.useSymmetry and self._clipRegion is None:
+                edges = self._createSymmetricEdges(useNumpy, cache)
+            else:
+                edges = self._createEdges(useNumpy, cache)
+            if cache is not None and self._clipRegion is None:
+                with self.span('cache'):
+                    cache.storeEdges(cacheKey, edges, useNumpy)
+
+        if useNumpy:
+            self._drawEdgeArrays(edges[0], edges[1], style)
+        else:
+            self._drawEdges(edges, style)
 
 
-# Create effect instance and apply it.
-effect = PenroseTiling()
-effect.affect()
+if __name__ == '__main__':
+    # Create effect instance and apply it.
+    effect = PenroseTiling()
+    effect.affect()
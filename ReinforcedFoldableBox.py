@@ -52,145 +52,146 @@ class FoldableBox(SvgBasics.BaseEffectExtension):
         startX = 2 * self._height
         startY = lidFlapSize
 
-        outline = SvgBasics.moveAbs(startX, startY)
+        outline = SvgBasics.PathBuilder().moveAbs(startX, startY)
 
         # Top left flap
-        outline += SvgBasics.arcRel(self._height, .5 * self._width, 0, False, False, -self._height, .5 * self._width)
-        outline += SvgBasics.lineRel(self._height, 0)
+        outline.arcRel(self._height, .5 * self._width, 0, False, False, -self._height, .5 * self._width)
+        outline.lineRel(self._height, 0)
 
         # side hook
-        outline += self.addLeftSideHook()
+        self.addLeftSideHook(outline)
 
         # central flap that folds on itself and is kept in place by the semicircle cutout
-        outline += self._addCentralFlap(1)
+        self._addCentralFlap(outline, 1)
 
         # side hook
-        outline += self.addLeftSideHook()
+        self.addLeftSideHook(outline)
 
         # lower left lid flap
-        outline += SvgBasics.lineRel(-self._height, 0)
-        outline += SvgBasics.arcRel(self._height, .5 * self._width, 0, False, False, self._height, .5 * self._width)
+        outline.lineRel(-self._height, 0)
+        outline.arcRel(self._height, .5 * self._width, 0, False, False, self._height, .5 * self._width)
 
         # bottom half lid
-        outline += SvgBasics.lineRel(.5 * self._depth, 0)
-        outline += SvgBasics.circRel(lidFlapSize, False, False, lidFlapSize, lidFlapSize)
-        outline += SvgBasics.arcRel(.5 * self._depth - lidFlapSize, lidFlapSize, 0, False, False, .5 * self._depth - lidFlapSize, -lidFlapSize)
+        outline.lineRel(.5 * self._depth, 0)
+        outline.circRel(lidFlapSize, False, False, lidFlapSize, lidFlapSize)
+        outline.arcRel(.5 * self._depth - lidFlapSize, lidFlapSize, 0, False, False, .5 * self._depth - lidFlapSize, -lidFlapSize)
 
         # lower right lid flap
-        outline += SvgBasics.arcRel(self._height, .5 * self._width, 0, False, False, self._height, -.5 * self._width)
-        outline += SvgBasics.lineRel(-self._height, 0)
+        outline.arcRel(self._height, .5 * self._width, 0, False, False, self._height, -.5 * self._width)
+        outline.lineRel(-self._height, 0)
 
         # side hook
-        outline += self.addRightSideHook()
+        self.addRightSideHook(outline)
 
         # central flap that folds on itself and is kept in place by the semicircle cutout
-        outline += self._addCentralFlap(-1)
+        self._addCentralFlap(outline, -1)
 
         # side hook
-        outline += self.addRightSideHook()
+        self.addRightSideHook(outline)
 
         # upper right lid flap
-        outline += SvgBasics.lineRel(self._height, 0)
-        outline += SvgBasics.arcRel(self._height, .5 * self._width, 0, False, False, -self._height, -.5 * self._width)
+        outline.lineRel(self._height, 0)
+        outline.arcRel(self._height, .5 * self._width, 0, False, False, -self._height, -.5 * self._width)
 
         # bottom half lid
-        outline += SvgBasics.lineRel(-.5 * self._depth, 0)
-        outline += SvgBasics.circRel(lidFlapSize, False, False, -lidFlapSize, -lidFlapSize)
-        outline += SvgBasics.arcRel(.5 * self._depth - lidFlapSize, lidFlapSize, 0, False, False, -(.5 * self._depth - lidFlapSize), lidFlapSize)
+        outline.lineRel(-.5 * self._depth, 0)
+        outline.circRel(lidFlapSize, False, False, -lidFlapSize, -lidFlapSize)
+        outline.arcRel(.5 * self._depth - lidFlapSize, lidFlapSize, 0, False, False, -(.5 * self._depth - lidFlapSize), lidFlapSize)
 
-        outline += ' z '
+        outline.close()
 
         firstCutLineVerticalOffset = startY + self._width / 2 + self._sideHookFoldingGap + self._sideHookGap
         secondCutLineVerticalOffset = startY + self._width * 1.5 + self._height + self._sideHookFoldingGap + self._sideHookGap
         leftCutLineHorizontalOffset = 2 * self._height - self._width / 2
         rightCutLineHorizontalOffset = leftCutLineHorizontalOffset + self._depth + self._width
-        outline += SvgBasics.moveAbs(leftCutLineHorizontalOffset, firstCutLineVerticalOffset)
-        outline += SvgBasics.lineRel(0, sideHookCutlineLength)
-        outline += SvgBasics.moveAbs(rightCutLineHorizontalOffset, firstCutLineVerticalOffset)
-        outline += SvgBasics.lineRel(0, sideHookCutlineLength)
-        outline += SvgBasics.moveAbs(leftCutLineHorizontalOffset, secondCutLineVerticalOffset)
-        outline += SvgBasics.lineRel(0, sideHookCutlineLength)
-        outline += SvgBasics.moveAbs(rightCutLineHorizontalOffset, secondCutLineVerticalOffset)
-        outline += SvgBasics.lineRel(0, sideHookCutlineLength)
+        outline.moveAbs(leftCutLineHorizontalOffset, firstCutLineVerticalOffset)
+        outline.lineRel(0, sideHookCutlineLength)
+        outline.moveAbs(rightCutLineHorizontalOffset, firstCutLineVerticalOffset)
+        outline.lineRel(0, sideHookCutlineLength)
+        outline.moveAbs(leftCutLineHorizontalOffset, secondCutLineVerticalOffset)
+        outline.lineRel(0, sideHookCutlineLength)
+        outline.moveAbs(rightCutLineHorizontalOffset, secondCutLineVerticalOffset)
+        outline.lineRel(0, sideHookCutlineLength)
 
         centralArcRadius = self._width / 10
         centralArcX = 2 * self._height
         centralArcY = startY + self._width + self._height - centralArcRadius
-        outline += SvgBasics.moveAbs(centralArcX, centralArcY)
-        outline += SvgBasics.circRel(centralArcRadius, False, False, 0, 2 * centralArcRadius)
-        outline += SvgBasics.moveRel(self._depth, 0)
-        outline += SvgBasics.circRel(centralArcRadius, False, False, 0, -2 * centralArcRadius)
+        outline.moveAbs(centralArcX, centralArcY)
+        outline.circRel(centralArcRadius, False, False, 0, 2 * centralArcRadius)
+        outline.moveRel(self._depth, 0)
+        outline.circRel(centralArcRadius, False, False, 0, -2 * centralArcRadius)
 
         style = simplestyle.formatStyle({'stroke': '#000000', 'stroke-width': str(self._linewidth), 'fill': '#808080'})
         self._addPathToDocumentTree(style, outline)
 
-        foldline = SvgBasics.moveAbs(startX + self._depth / 2, startY)
-        foldline += SvgBasics.lineRel(-self._depth / 2, 0)
-        foldline += SvgBasics.lineRel(0, self._width / 2)
-        foldline += SvgBasics.lineRel(self._depth, 0)
-        foldline += SvgBasics.lineRel(0, -self._width / 2)
-
-        foldline += SvgBasics.moveAbs(startX, startY + self._width / 2 + self._sideHookFoldingGap)
-        foldline += SvgBasics.lineRel(0, sideHookReducedHeight)
-        foldline += SvgBasics.moveRel(self._depth, -sideHookReducedHeight)
-        foldline += SvgBasics.lineRel(0, sideHookReducedHeight)
-        foldline += SvgBasics.moveRel(0, self._sideHookFoldingGap)
-        foldline += SvgBasics.lineRel(-self._depth,0)
-
-        foldline += SvgBasics.moveRel(-self._height, 0)
-        foldline += SvgBasics.lineRel(0, self._width)
-        foldline += SvgBasics.moveRel(self._height, 0)
-        foldline += SvgBasics.lineRel(0, -self._width)
-        foldline += SvgBasics.moveRel(self._depth, 0)
-        foldline += SvgBasics.lineRel(0, self._width)
-        foldline += SvgBasics.moveRel(self._height, 0)
-        foldline += SvgBasics.lineRel(0, -self._width)
-        foldline += SvgBasics.moveRel(-self._height ,self._width)
-        foldline += SvgBasics.lineRel(-self._depth, 0)
-
-        foldline += SvgBasics.moveRel(0, self._sideHookFoldingGap)
-        foldline += SvgBasics.lineRel(0, sideHookReducedHeight)
-        foldline += SvgBasics.moveRel(self._depth, 0)
-        foldline += SvgBasics.lineRel(0, -sideHookReducedHeight)
-
-        foldline += SvgBasics.moveRel(-self._depth / 2, self._sideHookFoldingGap + sideHookReducedHeight + self._width / 2)
-        foldline += SvgBasics.lineRel(self._depth / 2, 0)
-        foldline += SvgBasics.lineRel(0, -self._width / 2)
-        foldline += SvgBasics.lineRel(-self._depth, 0)
-        foldline += SvgBasics.lineRel(0, self._width / 2)
+        foldline = SvgBasics.PathBuilder().moveAbs(startX + self._depth / 2, startY)
+        foldline.lineRel(-self._depth / 2, 0)
+        foldline.lineRel(0, self._width / 2)
+        foldline.lineRel(self._depth, 0)
+        foldline.lineRel(0, -self._width / 2)
+
+        foldline.moveAbs(startX, startY + self._width / 2 + self._sideHookFoldingGap)
+        foldline.lineRel(0, sideHookReducedHeight)
+        foldline.moveRel(self._depth, -sideHookReducedHeight)
+        foldline.lineRel(0, sideHookReducedHeight)
+        foldline.moveRel(0, self._sideHookFoldingGap)
+        foldline.lineRel(-self._depth,0)
+
+        foldline.moveRel(-self._height, 0)
+        foldline.lineRel(0, self._width)
+        foldline.moveRel(self._height, 0)
+        foldline.lineRel(0, -self._width)
+        foldline.moveRel(self._depth, 0)
+        foldline.lineRel(0, self._width)
+        foldline.moveRel(self._height, 0)
+        foldline.lineRel(0, -self._width)
+        foldline.moveRel(-self._height ,self._width)
+        foldline.lineRel(-self._depth, 0)
+
+        foldline.moveRel(0, self._sideHookFoldingGap)
+        foldline.lineRel(0, sideHookReducedHeight)
+        foldline.moveRel(self._depth, 0)
+        foldline.lineRel(0, -sideHookReducedHeight)
+
+        foldline.moveRel(-self._depth / 2, self._sideHookFoldingGap + sideHookReducedHeight + self._width / 2)
+        foldline.lineRel(self._depth / 2, 0)
+        foldline.lineRel(0, -self._width / 2)
+        foldline.lineRel(-self._depth, 0)
+        foldline.lineRel(0, self._width / 2)
 
         style = simplestyle.formatStyle({'stroke': '#FF0000', 'stroke-width': str(self._linewidth), 'fill': 'none'})
         self._addPathToDocumentTree(style, foldline)
 
-    def _addCentralFlap(self, factor):
-        centralFlap = SvgBasics.lineRel(factor * -2 * self._height, 0)
-        centralFlap += SvgBasics.lineRel(0, factor * self._width)
-        centralFlap += SvgBasics.lineRel(factor * 2 * self._height, 0)
+    def _addCentralFlap(self, centralFlap, factor):
+        centralFlap.lineRel(factor * -2 * self._height, 0)
+        centralFlap.lineRel(0, factor * self._width)
+        centralFlap.lineRel(factor * 2 * self._height, 0)
         return centralFlap
 
-    def addLeftSideHook(self):
+    def addLeftSideHook(self, sideHook):
         # side flap with hook
-        sideHook = SvgBasics.lineRel(0, self._sideHookFoldingGap)
-        sideHook += SvgBasics.lineRel(-.5 * self._width, 0)
-        sideHook += SvgBasics.lineRel(0, self._sideHookGap)
+        sideHook.lineRel(0, self._sideHookFoldingGap)
+        sideHook.lineRel(-.5 * self._width, 0)
+        sideHook.lineRel(0, self._sideHookGap)
         # this is the point to add a cut line
-        sideHook += SvgBasics.lineRel(-self._sideHookWidth, 0)
-        sideHook += SvgBasics.lineRel(0, self._sideHookOverlap)
-        sideHook += SvgBasics.lineRel(self._sideWidthIncludingHook, 0)
-        sideHook += SvgBasics.lineRel(0, self._sideHookFoldingGap)
+        sideHook.lineRel(-self._sideHookWidth, 0)
+        sideHook.lineRel(0, self._sideHookOverlap)
+        sideHook.lineRel(self._sideWidthIncludingHook, 0)
+        sideHook.lineRel(0, self._sideHookFoldingGap)
         return sideHook
 
-    def addRightSideHook(self):
+    def addRightSideHook(self, sideHook):
         # side flap with hook
-        sideHook = SvgBasics.lineRel(0, -self._sideHookFoldingGap)
-        sideHook += SvgBasics.lineRel(self._sideWidthIncludingHook, 0)
-        sideHook += SvgBasics.lineRel(0, -self._sideHookOverlap)
-        sideHook += SvgBasics.lineRel(-self._sideHookWidth, 0)
-        sideHook += SvgBasics.lineRel(0, -self._sideHookGap)
-        sideHook += SvgBasics.lineRel(-.5 * self._width, 0)
-        sideHook += SvgBasics.lineRel(0, -self._sideHookFoldingGap)
+        sideHook.lineRel(0, -self._sideHookFoldingGap)
+        sideHook.lineRel(self._sideWidthIncludingHook, 0)
+        sideHook.lineRel(0, -self._sideHookOverlap)
+        sideHook.lineRel(-self._sideHookWidth, 0)
+        sideHook.lineRel(0, -self._sideHookGap)
+        sideHook.lineRel(-.5 * self._width, 0)
+        sideHook.lineRel(0, -self._sideHookFoldingGap)
         return sideHook
 
-# Create effect instance and apply it.
-effect = FoldableBox()
-effect.affect()
+if __name__ == '__main__':
+    # Create effect instance and apply it.
+    effect = FoldableBox()
+    effect.affect()
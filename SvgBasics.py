@@ -1,6 +1,26 @@
+import array
+import hashlib
 import inkex
+import json
+import marshal
+import math
+import os
 import pprint
+import simplestyle
+import sys
+import tempfile
+import time
 import xml.etree.ElementTree as ElTree
+from xml.sax.saxutils import escape
+
+import CommonLines
+import PathChaining
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2, memory is not profiled
+    tracemalloc = None
 
 """
 General tools and a base class for Inkscape effect plugins.
@@ -48,6 +68,23 @@ def formatCoordinates(x, y):
     return '{0:f},{1:f}'.format(x, y)
 
 
+def formatNumber(value, precision):
+    """
+    Formats a number with at most precision decimal places as short as possible, i.e. without trailing zeros,
+    without a leading zero before the decimal point and without the sign of a negative zero.
+    """
+    text = '%.*f' % (precision, value)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    elif text == '-0':
+        text = '0'
+    return text
+
+
 def arcRel(radiusX, radiusY, xRot, isLargeArc, isSweep, toX, toY):
     largeArcFlag = '1' if isLargeArc else '0'
     sweepFlag = '1' if isSweep else '0'
@@ -84,65 +121,905 @@ def createRect(width, height, close=True):
     return rect
 
 
+class PathBuilder(object):
+    """
+    Collects the commands of an SVG path in compact numeric buffers and serializes them only once, when the path
+    data is requested. In contrast to concatenating strings, appending a command or another builder does not copy
+    what has been collected so far, so building a path is linear in the number of commands.
+
+    All methods that add commands return the builder itself, so calls can be chained.
+    """
+    # number of numeric arguments per path command
+    _argumentCounts = {'M': 2, 'm': 2, 'L': 2, 'l': 2, 'A': 7, 'a': 7, 'Z': 0, 'z': 0}
+
+    def __init__(self):
+        self._commands = array.array('B')
+        self._arguments = array.array('d')
+
+    def _add(self, command, *arguments):
+        self._commands.append(ord(command))
+        self._arguments.extend(arguments)
+        return self
+
+    def moveAbs(self, x, y):
+        return self._add('M', x, y)
+
+    def moveRel(self, x, y):
+        return self._add('m', x, y)
+
+    def lineAbs(self, x, y):
+        return self._add('L', x, y)
+
+    def lineRel(self, x, y):
+        return self._add('l', x, y)
+
+    def arcRel(self, radiusX, radiusY, xRot, isLargeArc, isSweep, toX, toY):
+        return self._add('a', radiusX, radiusY, xRot, 1 if isLargeArc else 0, 1 if isSweep else 0, toX, toY)
+
+    def circRel(self, radius, isLargeArc, isSweep, toX, toY):
+        return self.arcRel(radius, radius, 0, isLargeArc, isSweep, toX, toY)
+
+    def arcAbs(self, radiusX, radiusY, xRot, isLargeArc, isSweep, toX, toY):
+        return self._add('A', radiusX, radiusY, xRot, 1 if isLargeArc else 0, 1 if isSweep else 0, toX, toY)
+
+    def close(self):
+        return self._add('z')
+
+    def addLineSegments(self, coordinates):
+        """
+        Adds separate straight lines, i.e. an absolute move and an absolute line for each of them. coordinates is a
+        flat sequence of x1, y1, x2, y2 for each line.
+        """
+        segmentCount = len(coordinates) // 4
+        self._commands.extend(array.array('B', [ord('M'), ord('L')]) * segmentCount)
+        self._arguments.extend(array.array('d', coordinates))
+        return self
+
+    def tab(self, width, height):
+        return self.lineRel(width, 0).lineRel(0, height).lineRel(-width, 0)
+
+    def rect(self, width, height, close=True):
+        self.tab(width, height).lineRel(0, -height)
+        if close:
+            self.close()
+        return self
+
+    def extend(self, other):
+        """Appends all commands of another PathBuilder."""
+        self._commands.extend(other._commands)
+        self._arguments.extend(other._arguments)
+        return self
+
+    def extendRepeated(self, other, count):
+        """
+        Appends the commands of another PathBuilder count times. Meant for periodic patterns made of relative
+        commands, the copies are made by the buffers without looking at the single commands.
+        """
+        if count > 0:
+            self._commands.extend(other._commands * count)
+            self._arguments.extend(other._arguments * count)
+        return self
+
+    def iterateAbsolute(self):
+        """
+        Yields the commands with absolute coordinates as (command, arguments), where command is one of M, L, A and Z
+        and the arguments of Z are the coordinates of the point the subpath returns to.
+        """
+        x = y = startX = startY = 0.0
+        arguments = self._arguments
+        argIndex = 0
+        for code in self._commands:
+            command = chr(code)
+            argCount = PathBuilder._argumentCounts[command]
+            values = list(arguments[argIndex:argIndex + argCount])
+            argIndex += argCount
+            if command in 'Zz':
+                x, y = startX, startY
+                yield ('Z', [x, y])
+                continue
+            if command.islower():
+                values[-2] += x
+                values[-1] += y
+            x, y = values[-2], values[-1]
+            if command in 'Mm':
+                startX, startY = x, y
+            yield (command.upper(), values)
+
+    def getSubpaths(self):
+        """
+        Returns the subpaths that draw something as list of (startPoint, segments, isClosed). segments is a list of
+        (command, absolute arguments) with command L or A.
+        """
+        subpaths = []
+        current = None
+        point = (0.0, 0.0)
+        for command, values in self.iterateAbsolute():
+            if command == 'M':
+                current = None
+            elif command == 'Z':
+                if current is not None:
+                    current[2] = True
+                current = None
+            else:
+                if current is None:
+                    current = [point, [], False]
+                    subpaths.append(current)
+                current[1].append((command, values))
+            point = (values[-2], values[-1])
+        return [tuple(subpath) for subpath in subpaths]
+
+    def reversed(self):
+        """
+        Returns a new builder drawing the same shapes in the opposite order and direction, with absolute coordinates.
+        Moves that do not draw anything are dropped.
+        """
+        result = PathBuilder()
+        for startPoint, segments, isClosed in reversed(self.getSubpaths()):
+            # the end points of the segments, in reverse order
+            points = [startPoint] + [(values[-2], values[-1]) for command, values in segments]
+            endPoint = points[-1]
+            if isClosed:
+                result.moveAbs(*startPoint)
+                # the closing line comes first
+                if abs(endPoint[0] - startPoint[0]) > 1e-9 or abs(endPoint[1] - startPoint[1]) > 1e-9:
+                    result.lineAbs(*endPoint)
+            else:
+                result.moveAbs(*endPoint)
+            for index in range(len(segments) - 1, -1, -1):
+                command, values = segments[index]
+                toX, toY = points[index]
+                if command == 'A':
+                    # the arc is drawn in the other direction, so the sweep flag is flipped
+                    result.arcAbs(values[0], values[1], values[2], values[3], not values[4], toX, toY)
+                else:
+                    result.lineAbs(toX, toY)
+            if isClosed:
+                result.close()
+        return result
+
+    def _mapCoordinates(self, mapPoint, mapVector, arcRotation=0):
+        """
+        Returns a copy, whose absolute points are mapped with mapPoint(x, y) and relative ones with mapVector(dx, dy).
+        The first command is always mapped as a point, a leading m is absolute in SVG. arcRotation is added to the
+        rotation of the arcs.
+        """
+        result = PathBuilder()
+        result._commands.extend(self._commands)
+        arguments = self._arguments
+        argIndex = 0
+        for commandIndex, code in enumerate(self._commands):
+            command = chr(code)
+            argCount = PathBuilder._argumentCounts[command]
+            values = list(arguments[argIndex:argIndex + argCount])
+            argIndex += argCount
+            if argCount:
+                mapping = mapVector if command.islower() and commandIndex > 0 else mapPoint
+                values[-2], values[-1] = mapping(values[-2], values[-1])
+                if command in 'Aa':
+                    values[2] += arcRotation
+            result._arguments.extend(values)
+        return result
+
+    def translated(self, dx, dy):
+        """Returns a copy moved by (dx, dy), only the absolute commands change."""
+        return self._mapCoordinates(lambda x, y: (x + dx, y + dy), lambda x, y: (x, y))
+
+    def rotated90(self):
+        """Returns a copy rotated by 90 degrees around the origin, clockwise on the screen (the y axis points down)."""
+        return self._mapCoordinates(lambda x, y: (-y, x), lambda x, y: (-y, x), 90)
+
+    def getBoundingBox(self):
+        """
+        Returns (minX, minY, maxX, maxY) of the end points of all commands or None, if there are no commands. Arcs
+        bulging out beyond their end points are not considered.
+        """
+        xs = []
+        ys = []
+        for command, values in self.iterateAbsolute():
+            xs.append(values[-2])
+            ys.append(values[-1])
+        if not xs:
+            return None
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def getDrawnExtents(self):
+        """Returns (start point, end point) of every subpath that draws something, see getSubpaths."""
+        extents = []
+        for startPoint, segments, isClosed in self.getSubpaths():
+            command, values = segments[-1]
+            extents.append((startPoint, startPoint if isClosed else (values[-2], values[-1])))
+        return extents
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __str__(self):
+        return self.toString()
+
+    def toString(self, precision=None):
+        """
+        Serializes the collected commands. Without a precision every command is written verbosely with six decimal
+        places. With a precision the compact form is written: numbers are rounded to the given number of decimal
+        places and stripped of redundant characters, repeated commands are implicit and horizontal and vertical
+        lines use the h/v shortcuts.
+        """
+        if precision is not None:
+            return self._toCompactString(precision)
+        parts = []
+        arguments = self._arguments
+        argIndex = 0
+        for code in self._commands:
+            command = chr(code)
+            if command in 'Aa':
+                rx, ry, xRot, largeArc, sweep, x, y = arguments[argIndex:argIndex + 7]
+                parts.append(' {0} {1} {2:g} {3:d},{4:d} {5}'.format(command, formatCoordinates(rx, ry), xRot,
+                                                                      int(largeArc), int(sweep),
+                                                                      formatCoordinates(x, y)))
+            elif command in 'Zz':
+                parts.append(' ' + command)
+            else:
+                parts.append(' ' + command + ' ' + formatCoordinates(arguments[argIndex], arguments[argIndex + 1]))
+            argIndex += PathBuilder._argumentCounts[command]
+        return ''.join(parts)
+
+    def _toCompactString(self, precision):
+        parts = []
+        # the command that is implied, if a command letter is omitted, and the last number written
+        impliedCommand = None
+        lastNumber = None
+        # Relative coordinates are derived from the rounded absolute positions, so rounding errors do not add up
+        # along the path. The exact and the rounded positions are tracked for the current point and the start of
+        # the current subpath.
+        exactX = exactY = roundedX = roundedY = 0.0
+        startX = startY = roundedStartX = roundedStartY = 0.0
+        arguments = self._arguments
+        argIndex = 0
+        for code in self._commands:
+            command = chr(code)
+            argCount = PathBuilder._argumentCounts[command]
+            values = arguments[argIndex:argIndex + argCount]
+            argIndex += argCount
+
+            if command in 'Zz':
+                parts.append('z')
+                impliedCommand = lastNumber = None
+                exactX, exactY, roundedX, roundedY = startX, startY, roundedStartX, roundedStartY
+                continue
+
+            if command.islower():
+                exactX += values[-2]
+                exactY += values[-1]
+            else:
+                exactX, exactY = values[-2], values[-1]
+            newRoundedX = round(exactX, precision)
+            newRoundedY = round(exactY, precision)
+            if command.islower():
+                endX = formatNumber(newRoundedX - roundedX, precision)
+                endY = formatNumber(newRoundedY - roundedY, precision)
+            else:
+                endX = formatNumber(newRoundedX, precision)
+                endY = formatNumber(newRoundedY, precision)
+            currentX = '0' if command.islower() else formatNumber(roundedX, precision)
+            currentY = '0' if command.islower() else formatNumber(roundedY, precision)
+            roundedX, roundedY = newRoundedX, newRoundedY
+
+            if command in 'Mm':
+                startX, startY, roundedStartX, roundedStartY = exactX, exactY, roundedX, roundedY
+                numbers = [endX, endY]
+            elif command in 'Aa':
+                numbers = [formatNumber(value, precision) for value in values[0:3]]
+                numbers += [str(int(values[3])), str(int(values[4])), endX, endY]
+            elif endX == currentX:
+                command = 'v' if command.islower() else 'V'
+                numbers = [endY]
+            elif endY == currentY:
+                command = 'h' if command.islower() else 'H'
+                numbers = [endX]
+            else:
+                numbers = [endX, endY]
+
+            if command != impliedCommand:
+                parts.append(command)
+                lastNumber = None
+            impliedCommand = {'M': 'L', 'm': 'l'}.get(command, command)
+            for number in numbers:
+                # a separator is only needed, if the number could be read as part of the previous one
+                if lastNumber is not None and not number.startswith('-') and \
+                        not (number.startswith('.') and '.' in lastNumber):
+                    parts.append(' ')
+                parts.append(number)
+                lastNumber = number
+        return ''.join(parts)
+
+
+# bump this, when the structure of the option schema changes, so cached schemas are rebuilt
+OPTION_SCHEMA_VERSION = 1
+
+# option schemas loaded by this process, keyed by the path of the .inx file
+_optionSchemas = {}
+
+
+# straight cuts lying on top of each other within this distance are cut only once, see cutCommonLines
+COMMON_LINE_TOLERANCE = '0.01mm'
+
+
+def cutCommonLines(paths, tolerance):
+    """
+    Removes the line segments of the PathBuilders that lie on top of segments of the paths before them, see
+    CommonLines. Returns (paths, line length, removed length): paths contains for each path the path itself, if
+    nothing was removed from it, or a new PathBuilder with the remaining segments joined into polylines and its arcs
+    unchanged, or None, if nothing is left of it. The lengths are those of the line segments before and the length
+    removed.
+    """
+    segments = []
+    # for each path the range of its segments and its arcs
+    pathSegments = []
+    for path in paths:
+        firstSegment = len(segments)
+        arcs = PathBuilder()
+        for startPoint, subpathSegments, isClosed in path.getSubpaths():
+            x, y = startPoint
+            for command, values in subpathSegments:
+                if command == 'A':
+                    arcs.moveAbs(x, y).arcAbs(*values)
+                else:
+                    segments.append((x, y, values[-2], values[-1]))
+                x, y = values[-2], values[-1]
+            if isClosed and (x, y) != startPoint:
+                segments.append((x, y, startPoint[0], startPoint[1]))
+        pathSegments.append((firstSegment, len(segments), arcs))
+    keptPieces, removedLength = CommonLines.removeCommonLines(segments, tolerance)
+
+    result = []
+    for path, (firstSegment, lastSegment, arcs) in zip(paths, pathSegments):
+        indices = range(firstSegment, lastSegment)
+        if all(len(keptPieces[index]) == 1 and keptPieces[index][0] is segments[index] for index in indices):
+            result.append(path)
+            continue
+        newPath = PathBuilder()
+        for polyline in PathChaining.chainSegments([piece for index in indices for piece in keptPieces[index]]):
+            newPath.moveAbs(*polyline[0])
+            if len(polyline) > 2 and polyline[-1] == polyline[0]:
+                for x, y in polyline[1:-1]:
+                    newPath.lineAbs(x, y)
+                newPath.close()
+            else:
+                for x, y in polyline[1:]:
+                    newPath.lineAbs(x, y)
+        newPath.extend(arcs)
+        result.append(newPath if len(newPath) else None)
+    lineLength = sum(math.hypot(x2 - x1, y2 - y1) for x1, y1, x2, y2 in segments)
+    return result, lineLength, removedLength
+
+
+def _createOptionSpec(param):
+    attributes = param.attrib
+    paramName = attributes['name']
+    defaultValue = None
+    paramType = attributes['type']
+    if paramType in ['description', 'notebook'] :
+        # no option, but it is passed to _handleOption nevertheless
+        paramType = None
+    elif paramType in ['optiongroup', 'enum']:
+        # if you want ints or floats in an enum, you have to override _handleOption
+        # for me there was no need
+        paramType = 'string'
+        if param[0].attrib['value']:
+            defaultValue = param[0].attrib['value']
+        else:
+            raise Exception('No "value" attribute for first option of ' + paramType + '/' + paramName)
+    elif paramType == 'boolean':
+        paramType = 'inkbool'
+        defaultValue = to_bool(param.text)
+    elif paramType == 'float':
+        defaultValue = float(param.text)
+    elif paramType == 'int':
+        defaultValue = int(param.text)
+    elif paramType == 'string':
+        paramType = 'string'
+        # an empty element is an empty string, not "None"
+        defaultValue = str(param.text or '')
+    elif paramType == 'color':
+        paramType = 'string'
+        defaultValue = getColorString(0)
+
+    helpText = attributes.get('_gui-text', attributes.get('gui-text', ''))
+    return {'name': paramName, 'type': paramType, 'default': defaultValue, 'help': helpText}
+
+
+def parseOptionSchema(inxFile):
+    """
+    Parses the param nodes of an .inx file. Returns a list of dicts with the keys name, type (the optparse type or
+    None, if the param is no option, e.g. a description), default and help.
+    """
+    root = ElTree.parse(inxFile).getroot()
+    namespacePrefix = root.tag[0:-1 * len('inkscape-extension')]
+    try:
+        # Python 2.6, which is bundled with Inkscape throws an error, when using the non-deprecated iter method
+        params = root.iter(namespacePrefix + 'param')
+    except AttributeError:
+        params = root.getiterator(namespacePrefix + 'param')
+    return [_createOptionSpec(param) for param in params]
+
+
+def getCacheDir():
+    """The directory for cached data. Can be set by the environment variable INKSCAPE_EXT_CACHE_DIR."""
+    return os.environ.get('INKSCAPE_EXT_CACHE_DIR',
+                          os.path.join(tempfile.gettempdir(), 'inkscape-extensions-cache'))
+
+
+def getOptionSchemaCacheDir():
+    """The directory for cached option schemas, see getCacheDir."""
+    return getCacheDir()
+
+
+def _getOptionSchemaCacheFile(inxFile):
+    pathHash = hashlib.md5(inxFile.encode('utf-8')).hexdigest()
+    return os.path.join(getOptionSchemaCacheDir(), 'schema-py%d%d-%s.marshal' % (sys.version_info[0],
+                                                                                sys.version_info[1], pathHash))
+
+
+def _readCachedOptionSchema(cacheFile, cacheKey):
+    try:
+        with open(cacheFile, 'rb') as stream:
+            cachedKey, schema = marshal.load(stream)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    return schema if cachedKey == cacheKey else None
+
+
+def writeCacheFile(cacheFile, data):
+    """
+    Writes data into cacheFile, creating the directory if necessary. Returns False, if the file could not be written.
+    """
+    # A cache is only an optimization: if it cannot be written (read-only file system etc.), it is not used.
+    try:
+        cacheDir = os.path.dirname(cacheFile)
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        # write to a temporary file first, so concurrent processes never read a partially written cache
+        handle, temporaryFile = tempfile.mkstemp(dir=cacheDir)
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(data)
+        try:
+            if hasattr(os, 'replace'):
+                os.replace(temporaryFile, cacheFile)
+            else:
+                try:
+                    os.rename(temporaryFile, cacheFile)
+                except OSError:
+                    # on Windows, rename does not replace existing files, so a stale cache is removed first
+                    if not os.path.exists(cacheFile):
+                        raise
+                    os.remove(cacheFile)
+                    os.rename(temporaryFile, cacheFile)
+        except OSError:
+            os.remove(temporaryFile)
+            return False
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _writeCachedOptionSchema(cacheFile, cacheKey, schema):
+    writeCacheFile(cacheFile, marshal.dumps((cacheKey, schema)))
+
+
+def loadOptionSchema(inxFile, useCache=True):
+    """
+    Returns the option schema of an .inx file (see parseOptionSchema). The schema is cached in memory and in a
+    precompiled file in getOptionSchemaCacheDir(). A cached schema is discarded, when the modification time or the
+    size of the .inx file changes.
+    """
+    if not useCache:
+        return parseOptionSchema(inxFile)
+    inxFile = os.path.abspath(inxFile)
+    inxStat = os.stat(inxFile)
+    cacheKey = (OPTION_SCHEMA_VERSION, inxFile, inxStat.st_mtime, inxStat.st_size)
+
+    cached = _optionSchemas.get(inxFile)
+    if cached is not None and cached[0] == cacheKey:
+        return cached[1]
+    cacheFile = _getOptionSchemaCacheFile(inxFile)
+    schema = _readCachedOptionSchema(cacheFile, cacheKey)
+    if schema is None:
+        schema = parseOptionSchema(inxFile)
+        _writeCachedOptionSchema(cacheFile, cacheKey, schema)
+    _optionSchemas[inxFile] = (cacheKey, schema)
+    return schema
+
+
+# id of the style block, in which the CSS classes for the styles of the paths are defined
+STYLE_ELEMENT_ID = 'lasertools-styles'
+
+
+def getTemplateId(style, pathData):
+    """Returns the id of a template path (see BaseEffectExtension._addUsesToDocumentTree), derived from its content."""
+    return 'lasertools-template-' + hashlib.md5((style + '|' + pathData).encode('utf-8')).hexdigest()[:8]
+
+
+def getStyleClassName(style):
+    # derived from the style, so running an extension again on the same document reuses the class
+    return 'lasertools-' + hashlib.md5(style.encode('utf-8')).hexdigest()[:8]
+
+
+def _escapeAttribute(value):
+    return escape(value, {'"': '&quot;'})
+
+
+class StreamingSvgWriter(object):
+    """
+    Writes paths directly into an SVG stream instead of adding them to the document tree, so the generated document
+    never has to be held in memory. The existing content of the document (usually an empty template) is written
+    first, then the paths in a layer of their own and finally the style block with the CSS classes of the paths.
+    """
+    _marker = 'lasertools-stream-content'
+
+    def __init__(self, stream, root, name='Generated'):
+        self._stream = stream
+        self._styleRules = []
+        self._styleClasses = {}
+        # the template paths are written with the style block at the end
+        self._templates = []
+        self._templateIds = set()
+        # serialize the document with a marker where the paths are inserted
+        marker = inkex.etree.Comment(StreamingSvgWriter._marker)
+        root.append(marker)
+        try:
+            document = inkex.etree.tostring(root)
+        finally:
+            root.remove(marker)
+        if not isinstance(document, str):
+            document = document.decode('utf-8')
+        self._prefix, self._suffix = document.split('<!--' + StreamingSvgWriter._marker + '-->', 1)
+        stream.write(self._prefix)
+        # the namespaces are declared again, as the prefixes used for the document are unknown
+        stream.write('<g xmlns="%s" xmlns:inkscape="%s" xmlns:xlink="%s" inkscape:groupmode="layer" '
+                     'inkscape:label="%s">' % (inkex.NSS['svg'], inkex.NSS['inkscape'], inkex.NSS['xlink'],
+                                               _escapeAttribute(name)))
+
+    def getStyleClass(self, style):
+        className = self._styleClasses.get(style)
+        if className is None:
+            className = self._styleClasses[style] = getStyleClassName(style)
+            self._styleRules.append('.' + className + '{' + style + '}')
+        return className
+
+    def startGroup(self, name=None):
+        if name is None:
+            self._stream.write('<g>')
+        else:
+            self._stream.write('<g inkscape:label="%s">' % _escapeAttribute(name))
+
+    def endGroup(self):
+        self._stream.write('</g>')
+
+    def writePath(self, style, pathData, name=None):
+        label = '' if name is None else ' inkscape:label="%s"' % _escapeAttribute(name)
+        self._stream.write('<path class="%s" d="%s"%s/>\n' % (self.getStyleClass(style), pathData, label))
+
+    def writeTemplate(self, style, pathData):
+        """Adds a template path for writeUse and returns its id."""
+        templateId = getTemplateId(style, pathData)
+        if templateId not in self._templateIds:
+            self._templateIds.add(templateId)
+            self._templates.append('<path id="%s" class="%s" d="%s"/>\n' % (templateId, self.getStyleClass(style),
+                                                                          pathData))
+        return templateId
+
+    def writeUse(self, templateId, transform):
+        self._stream.write('<use xlink:href="#%s" transform="%s"/>\n' % (templateId, transform))
+
+    def close(self):
+        self._stream.write('<defs><style type="text/css">%s</style>%s</defs></g>' % ('\n'.join(self._styleRules),
+                                                                                   ''.join(self._templates)))
+        self._stream.write(self._suffix)
+        self._stream.flush()
+
+
+class _NullSpan(object):
+    """Used instead of a span, when profiling is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+_nullSpan = _NullSpan()
+
+
+class _Span(object):
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler._startSpan(self._name)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self._profiler._endSpan()
+        return False
+
+
+class Profiler(object):
+    """
+    Collects the time spent in named spans and the values of counters. Spans can be nested, their names are then
+    prefixed with the names of the enclosing spans, e.g. "effect/subdivide". If tracemalloc is available, the peak
+    of the memory allocated within each span is recorded as well (Python 3.9 or newer) and the overall peak.
+
+    As long as the profiler is disabled, spans and counters do nothing.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._spans = {}
+        self._counters = {}
+        # entries of the currently open spans: [full name, start time, peak memory seen so far]
+        self._openSpans = []
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name):
+        """Returns a context manager that adds the time spent within it to the span with the given name."""
+        if not self.enabled:
+            return _nullSpan
+        return _Span(self, name)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record(self, name, seconds, peakMemory=None):
+        """Adds a measurement taken outside of a span."""
+        spanData = self._spans.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peakMemory': None})
+        spanData['seconds'] += seconds
+        spanData['calls'] += 1
+        if peakMemory is not None:
+            spanData['peakMemory'] = max(spanData['peakMemory'] or 0, peakMemory)
+
+    def _getPeakMemory(self, reset):
+        if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        if reset:
+            tracemalloc.reset_peak()
+        return peak
+
+    def _startSpan(self, name):
+        if self._openSpans:
+            parent = self._openSpans[-1]
+            name = parent[0] + '/' + name
+            parent[2] = max(parent[2], self._getPeakMemory(False) or 0)
+        self._getPeakMemory(True)
+        self._openSpans.append([name, time.time(), 0])
+
+    def _endSpan(self):
+        name, startTime, peakMemory = self._openSpans.pop()
+        seconds = time.time() - startTime
+        peak = self._getPeakMemory(False)
+        if peak is not None:
+            peak = max(peak, peakMemory)
+            if self._openSpans:
+                self._openSpans[-1][2] = max(self._openSpans[-1][2], peak)
+        self.record(name, seconds, peak)
+
+    def getReport(self):
+        report = {'spans': self._spans, 'counters': self._counters, 'peakMemory': None}
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            # the peaks of the spans have to be considered, because tracemalloc's peak is reset for every span
+            spanPeaks = [spanData['peakMemory'] or 0 for spanData in self._spans.values()]
+            report['peakMemory'] = max([tracemalloc.get_traced_memory()[1]] + spanPeaks)
+        return report
+
+    def formatReport(self):
+        report = self.getReport()
+        lines = ['%-40s %10s %8s %12s' % ('span', 'seconds', 'calls', 'peak memory')]
+        for name in sorted(report['spans'].keys()):
+            spanData = report['spans'][name]
+            peakMemory = spanData['peakMemory']
+            lines.append('%-40s %10.4f %8d %12s' % (name, spanData['seconds'], spanData['calls'],
+                                                    'n/a' if peakMemory is None else peakMemory))
+        for name in sorted(report['counters'].keys()):
+            lines.append('%-40s %10s' % (name, report['counters'][name]))
+        if report['peakMemory'] is not None:
+            lines.append('%-40s %10s' % ('peak memory', report['peakMemory']))
+        return '\n'.join(lines)
+
+    def writeReport(self, destination):
+        """Writes the report to stderr (destination "stderr") or as JSON into the file destination."""
+        if destination == 'stderr':
+            sys.stderr.write(self.formatReport() + '\n')
+        else:
+            with open(destination, 'w') as stream:
+                json.dump(self.getReport(), stream, indent=2, sort_keys=True)
+
+
+# trace levels, a message is written if its level is lower or equal to the level selected with --trace
+TRACE_OFF = 0
+TRACE_INFO = 1
+TRACE_DEBUG = 2
+TRACE_VERBOSE = 3
+TRACE_LEVEL_NAMES = ['off', 'info', 'debug', 'verbose']
+
+
+def formatTraceMessage(message, args):
+    """
+    Builds the text of a trace message: a callable is called to get the payload, a string is formatted with the
+    arguments (%-style) and other payloads are pretty printed.
+    """
+    if callable(message):
+        message = message()
+    if args:
+        return message % args
+    if isinstance(message, (str, type(u''))):
+        return message
+    return pprint.pformat(message)
+
+
+def getTraceLevelFromEnvironment():
+    """
+    Returns the name of the trace level given by the environment variable INKSCAPE_EXT_TRACE or None. optparse does not
+    check defaults against the choices, so an unknown level is reported here and tracing stays off.
+    """
+    levelName = os.environ.get('INKSCAPE_EXT_TRACE')
+    if levelName and levelName not in TRACE_LEVEL_NAMES:
+        sys.stderr.write('Unknown trace level "%s" in INKSCAPE_EXT_TRACE, use one of: %s\n' % (
+            levelName, ', '.join(TRACE_LEVEL_NAMES)))
+        return None
+    return levelName or None
+
+
+def getPathLabel(path):
+    """Returns the label of a (style, svgPath) or (style, svgPath, label) tuple, see _addPathsToDocumentTree."""
+    return path[2] if len(path) > 2 else None
+
+
 class BaseEffectExtension(inkex.Effect):
     def __init__(self, inxFile, useDebugLogging=False):
         inkex.Effect.__init__(self)
-        self.__useDebugLogging = useDebugLogging
-        inxTree = ElTree.parse(inxFile)
-        root = inxTree.getroot()
-        namespacePrefix = root.tag[0:-1 * len('inkscape-extension')]
+        # log() traces at TRACE_DEBUG, so debug logging of the subclass is kept until --trace is given
+        self._traceLevel = TRACE_DEBUG if useDebugLogging else TRACE_OFF
+        self._profiler = Profiler()
+        # style -> name of the CSS class, see _getStyleClass
+        self._styleClasses = {}
+        startTime = time.time()
+        if not os.path.isabs(inxFile):
+            # the .inx files are located next to the scripts, regardless of the working directory
+            inxFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), inxFile)
+        for optionSpec in loadOptionSchema(inxFile):
+            self._addOption(optionSpec)
+        self.OptionParser.add_option('--profile', action='store', type='string', dest='profile',
+                                     default=os.environ.get('INKSCAPE_EXT_PROFILE'),
+                                     help='Report the time spent in each phase to stderr (value "stderr") or into '
+                                          'a JSON file (value is the file name)')
+        self.OptionParser.add_option('--stream', action='store', type='string', dest='stream', default=None,
+                                     help='Write the generated paths directly into this file ("-" for stdout) '
+                                          'instead of adding them to the document')
+        self.OptionParser.add_option('--trace', action='store', type='choice', dest='trace',
+                                     choices=TRACE_LEVEL_NAMES, default=getTraceLevelFromEnvironment(),
+                                     help='Write trace messages up to this level to stderr: ' +
+                                          ', '.join(TRACE_LEVEL_NAMES))
+        self.__schemaSeconds = time.time() - startTime
+        # set while the output is streamed, see StreamingSvgWriter
+        self._svgWriter = None
+        # (group index, group name, style, svgPath, name) of the paths added by the effect, while common lines are
+        # removed. The group index counts the calls of _addPathsToDocumentTree, it is None for single paths.
+        self._collectedPaths = None
+        self._collectedGroupCount = 0
+        self.__stream = None
+
+    def span(self, name):
+        """
+        Returns a context manager that measures the time spent within it, if profiling is enabled, e.g.
+            with self.span('subdivide'):
+                ...
+        """
+        return self._profiler.span(name)
+
+    def affect(self, args=sys.argv[1:], output=True):
+        # wrap the effect of the subclass, so it is measured as a phase of its own
+        effect = self.effect
+
+        def profiledEffect():
+            with self.span('effect'):
+                if self.options.stream:
+                    self._openStream()
+                try:
+                    if getattr(self.options, 'commonLines', False):
+                        self._cutCommonLinesOnce(effect)
+                    else:
+                        effect()
+                finally:
+                    self._closeStream()
+        self.effect = profiledEffect
         try:
-            # Python 2.6, which is bundled with Inkscape throws an error, when using the non-deprecated iter method
-            for param in root.iter(namespacePrefix + 'param'):
-                self._addOption(param)
-        except AttributeError:
-            for param in root.getiterator(namespacePrefix + 'param'):
-                self._addOption(param)
-
-    def log(self, what):
-        if self.__useDebugLogging:
-            inkex.debug(pprint.pformat(what))
-
-    def _handleOption(self, param, paramName):
-        """Override this to handle specific options. Return True, if you handled the option, False otherwise."""
-        return False
+            inkex.Effect.affect(self, args, output)
+        finally:
+            del self.effect
+        if self._profiler.enabled:
+            self._profiler.writeReport(self.options.profile)
+
+    def getoptions(self, args=sys.argv[1:]):
+        startTime = time.time()
+        inkex.Effect.getoptions(self, args)
+        if self.options.profile:
+            # the options have to be parsed, before we know whether profiling is enabled
+            self._profiler.enable()
+            self._profiler.record('schema', self.__schemaSeconds)
+            self._profiler.record('options', time.time() - startTime)
+        if self.options.trace:
+            self._traceLevel = TRACE_LEVEL_NAMES.index(self.options.trace)
 
-    def _addOption(self, param):
-        attributes = param.attrib
-        paramName = attributes['name']
-        if self._handleOption(param, paramName):
+    def parse(self, *args, **kwargs):
+        with self.span('parse'):
+            inkex.Effect.parse(self, *args, **kwargs)
+
+    def output(self):
+        if self.options.stream:
+            # the generated content has already been written
             return
+        with self.span('output'):
+            inkex.Effect.output(self)
+
+    def _openStream(self):
+        if self.options.stream == '-':
+            stream = sys.stdout
+        else:
+            stream = open(self.options.stream, 'w')
+        self._svgWriter = StreamingSvgWriter(stream, self.document.getroot(), self.__class__.__name__)
+        self.__stream = stream
 
-        defaultValue = None
-        paramType = attributes['type']
-        if paramType in ['description', 'notebook'] :
+    def _closeStream(self):
+        if self._svgWriter is None:
             return
-        elif paramType in ['optiongroup', 'enum']:
-            # if you want ints or floats in an enum, you have to override _handleOption
-            # for me there was no need
-            paramType = 'string'
-            if param[0].attrib['value']:
-                defaultValue = param[0].attrib['value']
-            else:
-                raise Exception('No "value" attribute for first option of ' + paramType + '/' + paramName)
-        elif paramType == 'boolean':
-            paramType = 'inkbool'
-            defaultValue = to_bool(param.text)
-        elif paramType == 'float':
-            defaultValue = float(param.text)
-        elif paramType == 'int':
-            defaultValue = int(param.text)
-        elif paramType == 'string':
-            paramType = 'string'
-            defaultValue = str(param.text)
-        elif paramType == 'color':
-            paramType = 'string'
-            defaultValue = getColorString(0)
-
-        helpText = attributes.get('_gui-text', attributes.get('gui-text', ''))
-
-        self.OptionParser.add_option('--' + paramName, action='store', type=paramType, dest=paramName,
-                                     default=defaultValue, help=helpText)
+        with self.span('output'):
+            self._svgWriter.close()
+        if self.__stream is not sys.stdout:
+            self.__stream.close()
+        self._svgWriter = None
+        self.__stream = None
+
+    def isTracing(self, level):
+        """Returns whether messages of the level are written, to guard code that only prepares trace messages."""
+        return level <= self._traceLevel
+
+    def trace(self, level, message, *args):
+        """
+        Writes a trace message to stderr, if the level is enabled. Nothing is built for disabled levels: pass a
+        format string with its arguments or a callable returning the payload instead of a prepared text, e.g.
+            self.trace(SvgBasics.TRACE_DEBUG, 'cut at %s', y)
+            self.trace(SvgBasics.TRACE_VERBOSE, lambda: {'cuts': cuts})
+        In hot loops even the call is avoided by comparing the level first:
+            if self._traceLevel >= SvgBasics.TRACE_VERBOSE:
+                self.trace(SvgBasics.TRACE_VERBOSE, 'cut at %s', y)
+        """
+        if level <= self._traceLevel:
+            inkex.debug('[%s] %s' % (TRACE_LEVEL_NAMES[level], formatTraceMessage(message, args)))
+
+    def log(self, what, *args):
+        """Traces at TRACE_DEBUG, see trace."""
+        self.trace(TRACE_DEBUG, what, *args)
+
+    def _handleOption(self, optionSpec, paramName):
+        """
+        Override this to handle specific options. optionSpec is the entry of the option schema (see
+        parseOptionSchema). Return True, if you handled the option, False otherwise.
+        """
+        return False
+
+    def _addOption(self, optionSpec):
+        paramName = optionSpec['name']
+        if self._handleOption(optionSpec, paramName):
+            return
+        if optionSpec['type'] is None:
+            return
+        self.OptionParser.add_option('--' + paramName, action='store', type=optionSpec['type'], dest=paramName,
+                                     default=optionSpec['default'], help=optionSpec['help'])
 
     def _checkAndGetUnit(self, unit=None):
         if unit is None:
@@ -153,6 +1030,8 @@ class BaseEffectExtension(inkex.Effect):
         return unit
 
     def logInUnit(self, valuesInInks, prefix='', unit=None):
+        if not self.isTracing(TRACE_DEBUG):
+            return
         unit = self._checkAndGetUnit(unit)
         l = ["%s: %s[%s]" % (k, "{0:.2f}".format(self.uutounit(v, self.options.unit)), unit) for k, v in
              sorted(valuesInInks.items())]
@@ -162,9 +1041,229 @@ class BaseEffectExtension(inkex.Effect):
         unit = self._checkAndGetUnit(unit)
         return self.unittouu(str(sizeInUserSpecifiedUnits) + unit)
 
+    def _formatPath(self, svgPath):
+        """Serializes a PathBuilder, compactly if the extension has a pathPrecision option. Strings are kept."""
+        if isinstance(svgPath, PathBuilder):
+            return svgPath.toString(getattr(self.options, 'pathPrecision', None))
+        return svgPath
+
     def _addPathToDocumentTree(self, style, svgPath, name=None):
-        lineAttributes = {'style': style, 'd': svgPath}
+        if self._collectedPaths is not None:
+            self._collectedPaths.append((None, None, style, svgPath, name))
+            return
+        with self.span('formatPath'):
+            pathData = self._formatPath(svgPath)
+        self._profiler.count('paths')
+        self._profiler.count('pathBytes', len(pathData))
+        if self._svgWriter is not None:
+            self._svgWriter.writePath(style, pathData, name)
+            return
+        lineAttributes = {'style': style, 'd': pathData}
         if name is not None:
             lineAttributes[inkex.addNS('label', 'inkscape')]=name
-        inkex.etree.SubElement(self.current_layer, inkex.addNS('path', 'svg'), lineAttributes)
+        with self.span('insertPath'):
+            inkex.etree.SubElement(self.current_layer, inkex.addNS('path', 'svg'), lineAttributes)
+
+    def _getDefsElement(self):
+        root = self.document.getroot()
+        defs = root.find(inkex.addNS('defs', 'svg'))
+        if defs is None:
+            defs = inkex.etree.Element(inkex.addNS('defs', 'svg'))
+            root.insert(0, defs)
+        return defs
+
+    def _getStyleElement(self):
+        root = self.document.getroot()
+        for styleElement in root.iter(inkex.addNS('style', 'svg')):
+            if styleElement.get('id') == STYLE_ELEMENT_ID:
+                return styleElement
+        styleElement = inkex.etree.SubElement(self._getDefsElement(), inkex.addNS('style', 'svg'),
+                                              {'id': STYLE_ELEMENT_ID, 'type': 'text/css'})
+        styleElement.text = ''
+        return styleElement
+
+    def _getStyleClass(self, style):
+        """
+        Returns the name of a CSS class with the given style (as created by simplestyle.formatStyle). The class is
+        added to the style block of the document, if it does not exist yet.
+        """
+        className = self._styleClasses.get(style)
+        if className is None:
+            className = getStyleClassName(style)
+            styleElement = self._getStyleElement()
+            rule = '.' + className + '{' + style + '}'
+            if rule not in (styleElement.text or ''):
+                styleElement.text = (styleElement.text or '') + rule + '\n'
+            self._styleClasses[style] = className
+        return className
+
+    def _addPathsToDocumentTree(self, paths, name=None):
+        """
+        Adds many paths in one go. paths is an iterable of (style, svgPath) or (style, svgPath, label) tuples. The
+        paths are added to a new group, which is returned, and refer to their style by a CSS class, so each distinct
+        style is stored only once in the document.
+
+        If the output is streamed, the paths are written as they are taken from the iterable, so a generator
+        keeps the memory usage low. None is returned in that case.
+        """
+        if self._collectedPaths is not None:
+            self._collectedGroupCount += 1
+            self._collectedPaths.extend((self._collectedGroupCount, name, path[0], path[1], getPathLabel(path))
+                                        for path in paths)
+            return None
+        if self._svgWriter is not None:
+            return self._streamPaths(paths, name)
+        with self.span('insertPaths'):
+            groupAttributes = {}
+            if name is not None:
+                groupAttributes[inkex.addNS('label', 'inkscape')] = name
+            group = inkex.etree.SubElement(self.current_layer, inkex.addNS('g', 'svg'), groupAttributes)
+            pathTag = inkex.addNS('path', 'svg')
+            labelAttribute = inkex.addNS('label', 'inkscape')
+            subElement = inkex.etree.SubElement
+            pathCount = 0
+            pathBytes = 0
+            for path in paths:
+                pathData = self._formatPath(path[1])
+                pathAttributes = {'class': self._getStyleClass(path[0]), 'd': pathData}
+                label = getPathLabel(path)
+                if label is not None:
+                    pathAttributes[labelAttribute] = label
+                subElement(group, pathTag, pathAttributes)
+                pathCount += 1
+                pathBytes += len(pathData)
+            self._profiler.count('paths', pathCount)
+            self._profiler.count('pathBytes', pathBytes)
+        return group
+
+    def _formatTranslation(self, x, y):
+        precision = getattr(self.options, 'pathPrecision', None)
+        if precision is None:
+            return 'translate(%s,%s)' % (x, y)
+        return 'translate(%s,%s)' % (formatNumber(x, precision), formatNumber(y, precision))
+
+    def _addTemplate(self, style, svgPath):
+        """Adds a path to the defs of the document (if it is not there yet) and returns its id."""
+        pathData = self._formatPath(svgPath)
+        self._profiler.count('templates')
+        self._profiler.count('pathBytes', len(pathData))
+        if self._svgWriter is not None:
+            return self._svgWriter.writeTemplate(style, pathData)
+        templateId = getTemplateId(style, pathData)
+        defs = self._getDefsElement()
+        for path in defs.iter(inkex.addNS('path', 'svg')):
+            if path.get('id') == templateId:
+                return templateId
+        inkex.etree.SubElement(defs, inkex.addNS('path', 'svg'),
+                               {'id': templateId, 'class': self._getStyleClass(style), 'd': pathData})
+        return templateId
+
+    def _addUsesToDocumentTree(self, templates, placements, name=None):
+        """
+        Adds paths that are repeated at different positions only once: templates is a list of (style, svgPath) tuples,
+        which are stored in the defs of the document. placements is an iterable of (template index, x, y); for each a
+        <use> element shows the template moved by (x, y). The <use> elements are added to a new group, which is
+        returned (None, if the output is streamed).
+        """
+        with self.span('insertUses'):
+            templateIds = [self._addTemplate(style, svgPath) for style, svgPath in templates]
+            href = inkex.addNS('href', 'xlink')
+            useCount = 0
+            if self._svgWriter is not None:
+                self._svgWriter.startGroup(name)
+                for index, x, y in placements:
+                    self._svgWriter.writeUse(templateIds[index], self._formatTranslation(x, y))
+                    useCount += 1
+                self._svgWriter.endGroup()
+                group = None
+            else:
+                groupAttributes = {}
+                if name is not None:
+                    groupAttributes[inkex.addNS('label', 'inkscape')] = name
+                group = inkex.etree.SubElement(self.current_layer, inkex.addNS('g', 'svg'), groupAttributes)
+                useTag = inkex.addNS('use', 'svg')
+                for index, x, y in placements:
+                    inkex.etree.SubElement(group, useTag, {href: '#' + templateIds[index],
+                                                           'transform': self._formatTranslation(x, y)})
+                    useCount += 1
+            self._profiler.count('uses', useCount)
+        return group
+
+    def _cutCommonLinesOnce(self, effect):
+        """
+        Runs the effect and removes the line segments that lie on top of each other from the paths it adds, see
+        CommonLines. Only paths with the same style in the same group are compared, e.g. cuts are not merged with
+        engravings. The paths that lost segments are replaced by the remaining segments joined into polylines,
+        drawn without fill; arcs are kept unchanged. All other paths are added as they are.
+        """
+        self._collectedPaths = []
+        self._collectedGroupCount = 0
+        try:
+            effect()
+            collectedPaths = self._collectedPaths
+        finally:
+            self._collectedPaths = None
+        # (group index, style) -> indices of the collected paths, in the order they were added
+        pathIndices = {}
+        for index, (groupIndex, groupName, style, svgPath, name) in enumerate(collectedPaths):
+            if isinstance(svgPath, PathBuilder):
+                pathIndices.setdefault((groupIndex, style), []).append(index)
+
+        tolerance = self.unittouu(COMMON_LINE_TOLERANCE)
+        totalLength = 0.0
+        totalRemoved = 0.0
+        # path data given as string is kept as it is
+        newPaths = [svgPath for groupIndex, groupName, style, svgPath, name in collectedPaths]
+        newStyles = [style for groupIndex, groupName, style, svgPath, name in collectedPaths]
+        for (groupIndex, style), indices in pathIndices.items():
+            with self.span('commonLines'):
+                paths, length, removedLength = cutCommonLines([newPaths[index] for index in indices], tolerance)
+            totalLength += length
+            totalRemoved += removedLength
+            noFillStyle = simplestyle.parseStyle(style)
+            noFillStyle['fill'] = 'none'
+            noFillStyle = simplestyle.formatStyle(noFillStyle)
+            for index, path in zip(indices, paths):
+                if path is not newPaths[index]:
+                    newPaths[index] = path
+                    newStyles[index] = noFillStyle
+
+        index = 0
+        while index < len(collectedPaths):
+            groupIndex, groupName = collectedPaths[index][:2]
+            if groupIndex is None:
+                if newPaths[index] is not None:
+                    self._addPathToDocumentTree(newStyles[index], newPaths[index], collectedPaths[index][4])
+                index += 1
+                continue
+            groupEnd = index
+            while groupEnd < len(collectedPaths) and collectedPaths[groupEnd][0] == groupIndex:
+                groupEnd += 1
+            self._addPathsToDocumentTree([(newStyles[pathIndex], newPaths[pathIndex], collectedPaths[pathIndex][4])
+                                          for pathIndex in range(index, groupEnd) if newPaths[pathIndex] is not None],
+                                         groupName)
+            index = groupEnd
+
+        self._profiler.count('line length', round(totalLength, 3))
+        self._profiler.count('common line length removed', round(totalRemoved, 3))
+        if self._traceLevel >= TRACE_INFO:
+            unit = self._checkAndGetUnit() if getattr(self.options, 'unit', None) else 'px'
+            self.trace(TRACE_INFO, 'common-line cutting saved %.2f %s of %.2f %s of straight cuts (%.1f %%)',
+                       self.uutounit(totalRemoved, unit), unit, self.uutounit(totalLength, unit), unit,
+                       100 * totalRemoved / totalLength if totalLength else 0)
+
+    def _streamPaths(self, paths, name):
+        with self.span('streamPaths'):
+            writer = self._svgWriter
+            writer.startGroup(name)
+            pathCount = 0
+            pathBytes = 0
+            for path in paths:
+                pathData = self._formatPath(path[1])
+                writer.writePath(path[0], pathData, getPathLabel(path))
+                pathCount += 1
+                pathBytes += len(pathData)
+            writer.endGroup()
+            self._profiler.count('paths', pathCount)
+            self._profiler.count('pathBytes', pathBytes)
 
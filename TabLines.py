@@ -33,33 +33,34 @@ class TabLines(SvgBasics.BaseEffectExtension):
         linewidth = self._conv(self.options.linewidth)
 
         offsetForClosedBox = 1 if self.options.createClosedShape else 0
-        line = SvgBasics.moveAbs((1 + offsetForClosedBox) * thickness, thickness)
-        cutouts = SvgBasics.moveAbs((3 + offsetForClosedBox) * thickness, thickness)
+        line = SvgBasics.PathBuilder().moveAbs((1 + offsetForClosedBox) * thickness, thickness)
+        cutouts = SvgBasics.PathBuilder().moveAbs((3 + offsetForClosedBox) * thickness, thickness)
 
-        line += SvgBasics.lineRel(0, leadingOffset)
-        cutouts += SvgBasics.moveRel(0, leadingOffset)
+        line.lineRel(0, leadingOffset)
+        cutouts.moveRel(0, leadingOffset)
 
         for i in xrange(1, self.options.countTabs + 1):
-            line += SvgBasics.createTab(thickness, lengthOfTabs)
-            cutouts += SvgBasics.createRect(thickness, lengthOfTabs)
+            line.tab(thickness, lengthOfTabs)
+            cutouts.rect(thickness, lengthOfTabs)
             if i < self.options.countTabs:
-                line += SvgBasics.lineRel(0, lengthOfGaps)
-                cutouts += SvgBasics.moveRel(0, lengthOfTabs + lengthOfGaps)
+                line.lineRel(0, lengthOfGaps)
+                cutouts.moveRel(0, lengthOfTabs + lengthOfGaps)
             elif trailingOffset > 0:
-                line += SvgBasics.lineRel(0, trailingOffset)
+                line.lineRel(0, trailingOffset)
 
         style = simplestyle.formatStyle(
             {'stroke': '#000000', 'stroke-width': str(linewidth), 'fill': 'none'})
 
         if self.options.createClosedShape:
-            line += SvgBasics.lineRel(-thickness,0)
-            line += SvgBasics.lineRel(0, -trailingOffset - self.options.countTabs * lengthOfTabs - (self.options.countTabs - 1) * lengthOfGaps - leadingOffset)
-            line += SvgBasics.lineRel(thickness,0)
-            line += ' z'
+            line.lineRel(-thickness,0)
+            line.lineRel(0, -trailingOffset - self.options.countTabs * lengthOfTabs - (self.options.countTabs - 1) * lengthOfGaps - leadingOffset)
+            line.lineRel(thickness,0)
+            line.close()
 
         self._addPathToDocumentTree(style, line)
         self._addPathToDocumentTree(style, cutouts)
 
-# Create effect instance and apply it.
-effect = TabLines()
-effect.affect()
+if __name__ == '__main__':
+    # Create effect instance and apply it.
+    effect = TabLines()
+    effect.affect()
@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks the generators with growing parameters and records wall time, peak memory and size of the output.
+
+Every case runs an extension on an empty document (as BatchRunner does, no Inkscape needed) in a fresh process,
+so the memory measurement is not influenced by previous cases. Peak memory is the maximum resident set size of the
+process; on Windows it is measured with tracemalloc, which slows down the generators.
+
+Usage:
+    python benchmarks/GeneratorBenchmark.py [--only PenroseTiling] [--output results.json]
+    python benchmarks/GeneratorBenchmark.py --compare baseline.json [--threshold 1.2]
+
+With --compare the results are compared to a previously recorded baseline; the exit code is 1, if a value got
+worse by more than the threshold factor.
+
+The inkex module of Inkscape has to be on the PYTHONPATH.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import multiprocessing
+import optparse
+import os
+import platform
+import sys
+import tempfile
+import time
+
+EXTENSIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, EXTENSIONS_DIR)
+
+import BatchRunner
+import inkex
+
+try:
+    import resource
+    tracemalloc = None
+except ImportError:
+    # not available on Windows, use tracemalloc instead (Python 3 only)
+    resource = None
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+# (extension, scaled option, values, fixed options)
+SUITE = [
+    # without the tiling cache, otherwise all runs but the first would measure cache hits instead of the subdivision
+    ('PenroseTiling', 'recursions', range(1, 13), {'combineLines': True, 'cacheSize': 0}),
+    ('LatticeLivingHinges', 'count_cuts', [10, 100, 1000, 5000], {'hinge_height': 50}),
+    ('LatticeLivingHinges', 'hinge_height', [50, 200, 1000, 3000], {'count_cuts': 10, 'useHairlines': False}),
+    ('LaserBox', 'countIndentsSides', [10, 100, 1000, 10000], {'height': 1000}),
+    ('LaserBox', 'countIndentsTopWidth', [11, 101, 1001, 10001], {'width': 1000, 'mergeSides': True}),
+    ('TabLines', 'countTabs', [10, 100, 1000, 10000], {}),
+]
+
+# differences below these values are considered noise when comparing with a baseline
+NOISE_FLOORS = {'seconds': 0.02, 'peakMemory': 1024 * 1024, 'outputBytes': 1024}
+
+
+def getCaseName(extensionName, optionName, value):
+    return '%s %s=%s' % (extensionName, optionName, value)
+
+
+def getPeakMemory():
+    if resource is not None:
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return maxRss if sys.platform == 'darwin' else maxRss * 1024
+    if tracemalloc is not None:
+        return tracemalloc.get_traced_memory()[1]
+    return None
+
+
+def runCase(case):
+    """Runs a single case, meant to be executed in a fresh worker process."""
+    extensionName, options, templateFile = case
+    if tracemalloc is not None:
+        tracemalloc.start()
+    startTime = time.time()
+    effect = BatchRunner.createExtension(extensionName)
+    effect.affect(BatchRunner.toArguments(options) + [templateFile], False)
+    generatedTime = time.time()
+    outputBytes = len(inkex.etree.tostring(effect.document.getroot()))
+    endTime = time.time()
+    return {'seconds': generatedTime - startTime, 'serializeSeconds': endTime - generatedTime,
+            'peakMemory': getPeakMemory(), 'outputBytes': outputBytes}
+
+
+def runSuite(only=None, repetitions=1):
+    handle, templateFile = tempfile.mkstemp(suffix='.svg')
+    os.write(handle, BatchRunner.DEFAULT_TEMPLATE.encode('utf-8'))
+    os.close(handle)
+    results = {}
+    try:
+        for extensionName, optionName, values, fixedOptions in SUITE:
+            if only and only not in getCaseName(extensionName, optionName, ''):
+                continue
+            for value in values:
+                options = dict(fixedOptions)
+                options[optionName] = value
+                name = getCaseName(extensionName, optionName, value)
+                # a new process for every run, so the peak memory of one case does not hide the next one
+                pool = multiprocessing.Pool(1, maxtasksperchild=1)
+                try:
+                    runs = pool.map(runCase, [(extensionName, options, templateFile)] * repetitions)
+                finally:
+                    pool.close()
+                    pool.join()
+                result = min(runs, key=lambda run: run['seconds'])
+                results[name] = result
+                sys.stdout.write('%-45s %9.3fs %9.3fs %10s %12d\n' % (name, result['seconds'],
+                                                                     result['serializeSeconds'],
+                                                                     formatBytes(result['peakMemory']),
+                                                                     result['outputBytes']))
+                sys.stdout.flush()
+    finally:
+        os.remove(templateFile)
+    return results
+
+
+def formatBytes(value):
+    if value is None:
+        return 'n/a'
+    return '%.1fMB' % (value / 1024.0 / 1024.0)
+
+
+def compareResults(baseline, results, threshold):
+    """Returns the list of regressions as (case, measure, baseline value, current value)."""
+    regressions = []
+    for name in sorted(results.keys()):
+        if name not in baseline:
+            continue
+        for measure, noiseFloor in sorted(NOISE_FLOORS.items()):
+            old = baseline[name].get(measure)
+            new = results[name].get(measure)
+            if old is None or new is None:
+                continue
+            if new > old * threshold and new - old > noiseFloor:
+                regressions.append((name, measure, old, new))
+    return regressions
+
+
+def main(args=sys.argv[1:]):
+    parser = optparse.OptionParser(usage='usage: %prog [options]')
+    parser.add_option('--only', dest='only', default=None,
+                      help='only run cases whose name contains this text, e.g. PenroseTiling')
+    parser.add_option('--repeat', dest='repetitions', type='int', default=1,
+                      help='runs per case, the fastest run is recorded [default: %default]')
+    parser.add_option('--output', dest='output', default=None, help='write the results to this JSON file')
+    parser.add_option('--compare', dest='compare', default=None, help='JSON file with the baseline results')
+    parser.add_option('--threshold', dest='threshold', type='float', default=1.2,
+                      help='factor by which a value may get worse before it is a regression [default: %default]')
+    options, arguments = parser.parse_args(args)
+
+    sys.stdout.write('%-45s %10s %10s %10s %12s\n' % ('case', 'generate', 'serialize', 'memory', 'bytes'))
+    results = runSuite(options.only, options.repetitions)
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump({'python': platform.python_version(), 'results': results}, stream, indent=2,
+                      sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as stream:
+            baseline = json.load(stream)['results']
+        regressions = compareResults(baseline, results, options.threshold)
+        for name, measure, old, new in regressions:
+            sys.stdout.write('REGRESSION %s %s: %s -> %s\n' % (name, measure, old, new))
+        sys.stdout.write('%d regressions\n' % len(regressions))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the time needed to load the option schema of every extension on startup: parsing the .inx file, reading
+the precompiled schema from the disk cache (i.e. the first start of a process) and the in-memory cache (further
+extension instances created by the same process, e.g. in batch runs).
+
+Usage: python benchmarks/StartupBenchmark.py [repetitions]
+
+The inkex module of Inkscape has to be on the PYTHONPATH.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import glob
+import os
+import sys
+import timeit
+
+EXTENSIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, EXTENSIONS_DIR)
+
+import SvgBasics
+
+
+def timePerCall(function, repetitions):
+    # best of three runs, to reduce the influence of other processes
+    return min(timeit.repeat(function, number=repetitions, repeat=3)) / repetitions
+
+
+def loadFromDiskCache(inxFile):
+    SvgBasics._optionSchemas.clear()
+    return SvgBasics.loadOptionSchema(inxFile)
+
+
+def main(args=sys.argv[1:]):
+    repetitions = int(args[0]) if args else 200
+    sys.stdout.write('%-28s %12s %12s %12s %9s\n' % ('inx file', 'parse [us]', 'disk [us]', 'memory [us]',
+                                                    'speedup'))
+    for inxFile in sorted(glob.glob(os.path.join(EXTENSIONS_DIR, '*.inx'))):
+        # make sure the disk cache exists and is up to date
+        SvgBasics.loadOptionSchema(inxFile)
+        parseTime = timePerCall(lambda: SvgBasics.parseOptionSchema(inxFile), repetitions)
+        diskTime = timePerCall(lambda: loadFromDiskCache(inxFile), repetitions)
+        memoryTime = timePerCall(lambda: SvgBasics.loadOptionSchema(inxFile), repetitions)
+        sys.stdout.write('%-28s %12.1f %12.1f %12.1f %8.1fx\n' % (os.path.basename(inxFile), parseTime * 1e6,
+                                                                 diskTime * 1e6, memoryTime * 1e6,
+                                                                 parseTime / diskTime))
+
+
+if __name__ == '__main__':
+    main()
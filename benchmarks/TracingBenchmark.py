@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the overhead of trace calls in hot loops while tracing is disabled.
+
+For each hot function the time per call is measured with tracing disabled and with the former style of debug
+logging, which built the logged dict or list on every call, even if logging was disabled. The hot functions compare
+the trace level before calling trace; the time of this check and of a disabled trace call are measured as well, the
+last column is the share of the check in the time of the function.
+
+Usage: python benchmarks/TracingBenchmark.py [repetitions]
+
+The inkex module of Inkscape has to be on the PYTHONPATH.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import timeit
+
+EXTENSIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, EXTENSIONS_DIR)
+
+import LaserBox
+import LatticeLivingHinges
+import SvgBasics
+
+
+def timePerCall(function, repetitions):
+    # best of three runs, to reduce the influence of other processes
+    return min(timeit.repeat(function, number=repetitions, repeat=3)) / repetitions
+
+
+def createExtension(extensionClass):
+    extension = extensionClass()
+    extension.getoptions([])
+    return extension
+
+
+def getHingeCase():
+    hinges = createExtension(LatticeLivingHinges.LatticeLivingHinges)
+    hinges._hingeHeight = 100.0
+    hinges._epsilon = 0.001
+
+    def formerLogging(absoluteY):
+        hinges.log({'absoluteY': absoluteY, 'self._hingeHeight': hinges._hingeHeight,
+                    'self._epsilon': hinges._epsilon, 'retval:': absoluteY >= hinges._hingeHeight - hinges._epsilon})
+        return absoluteY >= hinges._hingeHeight - hinges._epsilon
+
+    return hinges, 'LatticeLivingHinges._isBottomReached', lambda: hinges._isBottomReached(50.0), \
+        lambda: formerLogging(50.0)
+
+
+def getIndentedEdgeCase():
+    box = createExtension(LaserBox.LaserBox)
+    box.thickness = 3.0
+    arguments = (10, 5.0, LaserBox.SOUTH, False, 1.0, 2.0)
+
+    def formerLogging():
+        # the former method built the list of its arguments for the log call
+        box.log(list(arguments))
+        box._createIndentedEdge(*arguments)
+
+    # _generateIndentedEdge reuses the edges created before, so the creation of an edge is measured
+    return box, 'LaserBox._createIndentedEdge', lambda: box._createIndentedEdge(*arguments), formerLogging
+
+
+def main(args=sys.argv[1:]):
+    repetitions = int(args[0]) if args else 100000
+    sys.stdout.write('%-38s %13s %13s %10s %10s %7s\n' % ('function', 'disabled [ns]', 'former [ns]', 'check [ns]',
+                                                          'call [ns]', 'share'))
+    for extension, name, function, formerFunction in (getHingeCase(), getIndentedEdgeCase()):
+        functionTime = timePerCall(function, repetitions)
+        formerTime = timePerCall(formerFunction, repetitions)
+        checkTime = timePerCall(lambda: extension._traceLevel >= SvgBasics.TRACE_VERBOSE, repetitions) - \
+            timePerCall(lambda: None, repetitions)
+        callTime = timePerCall(lambda: extension.trace(SvgBasics.TRACE_VERBOSE, 'value %s', 1.0), repetitions) - \
+            timePerCall(lambda: None, repetitions)
+        sys.stdout.write('%-38s %13.1f %13.1f %10.1f %10.1f %6.1f%%\n' % (name, functionTime * 1e9, formerTime * 1e9,
+                                                                         checkTime * 1e9, callTime * 1e9,
+                                                                         checkTime / functionTime * 100))
+
+
+if __name__ == '__main__':
+    main()